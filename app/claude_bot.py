@@ -3,19 +3,30 @@ import asyncio
 import json
 import traceback
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Set, List
+from typing import AsyncIterator, Dict, Optional, Set, List, Tuple
 from pathlib import Path
 
 import discord
 from discord.ext import commands, tasks
 
 from app.services.claude_service import ClaudeService
+from app.services.http_client import HttpClientManager
+from app.services.response_cache import ResponseCache
+from app.services.resilience import ResilientCaller
+from app.services.concurrency_governor import ConcurrencyGovernor
+from app.services.model_router import ModelRouter
+from app.services.mention_batcher import build_batch_prompt, split_batch_response
+from app.services.stream_reply_service import STREAM_INTERRUPTED_MARKER, StreamReplyService
 from app.services.file_sharing_service import FileShareService
 from app.services.logging_service import LoggingService
-from app.services.rate_limiter import RateLimiter
+from app.services.rate_limiter import RateLimit, RateLimiter
 from app.services.conversation_manager import ConversationManager
+from app.services.conversation_persister import ConversationPersister
 from app.services.queue_service import QueueService
+from app.services.admission_controller import AdmissionController
 from app.services.analytics_service import AnalyticsService
+from app.database import db_manager
+from app.database.migrations import migrate_conversation_messages
 from app.utils.config import BotConfig
 from app.utils.permissions import is_admin_or_bot_owner
 
@@ -40,12 +51,102 @@ class ClaudeBot(commands.Bot):
         self.logger = LoggingService()
         
         try:
-            self.rate_limiter = RateLimiter(max_calls=self.config.max_messages_per_minute)
-            self.claude_service = ClaudeService(api_key=self.config.claude_api_key)
+            per_minute = {
+                'user': self.config.max_messages_per_minute,
+                'channel': self.config.channel_messages_per_minute,
+                'guild': self.config.guild_messages_per_minute,
+                'global': self.config.global_messages_per_minute
+            }
+            self.rate_limiter = RateLimiter(limits={
+                scope: RateLimit(calls, 60.0) for scope, calls in per_minute.items() if calls > 0
+            })
+            self.http_client = HttpClientManager(
+                limit=self.config.http_pool_limit,
+                limit_per_host=self.config.http_pool_limit_per_host,
+                keepalive_timeout=self.config.http_keepalive_timeout,
+                dns_cache_ttl=self.config.http_dns_cache_ttl,
+                connect_timeout=self.config.http_connect_timeout
+            )
+            self.response_cache = None
+            if self.config.response_cache_enabled:
+                self.response_cache = ResponseCache(
+                    max_entries=self.config.response_cache_max_entries,
+                    max_bytes=self.config.response_cache_max_bytes,
+                    ttl_seconds=self.config.response_cache_ttl,
+                    context_aware=self.config.response_cache_context_aware,
+                    disabled_guilds=self.config.response_cache_disabled_guilds
+                )
+            self.queue_service = QueueService(
+                max_concurrent=self.config.queue_max_per_channel,
+                workers=self.config.queue_workers,
+                max_per_guild=self.config.queue_max_per_guild,
+                max_waiting=self.config.queue_max_waiting,
+                max_waiting_per_guild=self.config.queue_max_waiting_per_guild
+            )
+            self.admission_controller = AdmissionController(
+                self.queue_service,
+                deadline=self.config.admission_deadline,
+                notify_after=self.config.admission_notify_after
+            )
+            self.claude_service = ClaudeService(
+                api_key=self.config.claude_api_key,
+                api_keys=self.config.claude_api_keys,
+                http_client=self.http_client,
+                request_timeout=self.config.claude_request_timeout,
+                api_url=self.config.anthropic_api_url,
+                prompt_caching=self.config.prompt_caching,
+                prompt_cache_min_tokens=self.config.prompt_cache_min_tokens,
+                response_cache=self.response_cache,
+                resilience=ResilientCaller(
+                    max_retries=self.config.claude_max_retries,
+                    base_delay=self.config.claude_retry_base_delay,
+                    max_delay=self.config.claude_retry_max_delay,
+                    failure_threshold=self.config.claude_breaker_threshold,
+                    recovery_timeout=self.config.claude_breaker_recovery,
+                    hedge_after=self.config.claude_hedge_after
+                ),
+                governor=ConcurrencyGovernor(
+                    requests_per_minute=self.config.claude_requests_per_minute,
+                    tokens_per_minute=self.config.claude_tokens_per_minute,
+                    max_concurrency=self.config.claude_max_concurrency
+                ),
+                router=ModelRouter(
+                    default_model=self.config.claude_model,
+                    fast_model=self.config.claude_fast_model,
+                    default_max_tokens=self.config.claude_max_tokens,
+                    degraded_max_tokens=self.config.degraded_max_tokens,
+                    long_prompt_tokens=self.config.long_prompt_tokens,
+                    queue_pressure_threshold=self.config.queue_pressure_threshold,
+                    premium_guilds=self.config.premium_guilds,
+                    queue_depth=self.queue_service.get_pending_count
+                ),
+                summary_model=self.config.summary_model
+            )
             self.file_share_service = FileShareService(credentials_path='credentials/credentials.json')
-            self.conversation_manager = ConversationManager()
-            self.queue_service = QueueService()
+            self.conversation_persister = None
+            if self.config.persist_conversations:
+                self.conversation_persister = ConversationPersister(
+                    db_manager.async_session,
+                    flush_interval=self.config.persist_flush_interval,
+                    batch_size=self.config.persist_batch_size
+                )
+            self.conversation_manager = ConversationManager(
+                context_token_budget=self.config.context_token_budget,
+                max_channel_tokens=self.config.max_channel_tokens,
+                max_channel_bytes=self.config.max_channel_bytes,
+                max_channels=self.config.max_resident_channels,
+                max_total_bytes=self.config.max_resident_bytes,
+                idle_ttl=self.config.conversation_idle_ttl,
+                spill_dir=self.config.conversation_spill_dir,
+                compress_after=self.config.conversation_compress_after,
+                persister=self.conversation_persister,
+                summary_threshold_tokens=self.config.summary_threshold_tokens,
+                summary_keep_tokens=self.config.summary_keep_tokens
+            )
+            if self.config.summarize_conversations:
+                self.conversation_manager.summarizer = self.claude_service.summarize_conversation
             self.analytics_service = AnalyticsService(max_records=200)
+            self.stream_reply_service = StreamReplyService(edit_interval=self.config.stream_edit_interval)
         except Exception as e:
             self.logger.error(f"Failed to initialize services: {e}")
             self.logger.error(traceback.format_exc())
@@ -57,20 +158,19 @@ class ClaudeBot(commands.Bot):
 
     async def get_claude_response(self, user_id: str, message: str, channel_id: int, server_id: str) -> str:
         try:
-            context = self.conversation_manager.get_context(channel_id)
-            
-            if context:
-                message = f"Previous conversation:\n{context}\n\nNew message: {message}"
+            await self.conversation_manager.ensure_loaded(channel_id)
+            history = self.conversation_manager.get_messages(channel_id)
             
             response = await self.claude_service.get_response(
                 user_id=user_id,
                 message=message,
                 channel_id=channel_id,
-                server_id=server_id
+                server_id=server_id,
+                history=history
             )
             
-            self.conversation_manager.add_message(channel_id, message, is_bot=False)
-            self.conversation_manager.add_message(channel_id, response, is_bot=True)
+            self.conversation_manager.add_message(channel_id, message, is_bot=False, server_id=server_id, user_id=user_id)
+            self.conversation_manager.add_message(channel_id, response, is_bot=True, server_id=server_id)
             
             return response
         except Exception as e:
@@ -78,11 +178,95 @@ class ClaudeBot(commands.Bot):
             self.analytics_service.add_error("claude_response", str(e))
             return "I encountered an error processing your request. Please try again."
 
+    async def get_claude_batch_response(
+        self,
+        questions: List[Tuple[str, str, str]],
+        channel_id: int,
+        server_id: str
+    ) -> Tuple[str, Optional[List[str]]]:
+        """
+        Answer several (user id, display name, question) mentions with one call
+
+        The channel history only records each question under its author and
+        each answer after it; the batching instructions are never stored.
+
+        :return: The whole response, and one answer per question or None if
+            the response could not be split
+        """
+        try:
+            await self.conversation_manager.ensure_loaded(channel_id)
+            history = self.conversation_manager.get_messages(channel_id)
+
+            response = await self.claude_service.get_response(
+                user_id=questions[0][0],
+                message=build_batch_prompt([(name, question) for _, name, question in questions]),
+                channel_id=channel_id,
+                server_id=server_id,
+                history=history
+            )
+            answers = split_batch_response(response, len(questions))
+
+            if answers is None:
+                for user_id, _, question in questions:
+                    self.conversation_manager.add_message(channel_id, question, is_bot=False, server_id=server_id, user_id=user_id)
+                self.conversation_manager.add_message(channel_id, response, is_bot=True, server_id=server_id)
+            else:
+                for (user_id, _, question), answer in zip(questions, answers):
+                    self.conversation_manager.add_message(channel_id, question, is_bot=False, server_id=server_id, user_id=user_id)
+                    self.conversation_manager.add_message(channel_id, answer, is_bot=True, server_id=server_id)
+
+            return response, answers
+        except Exception as e:
+            self.logger.error(f"Error in get_claude_batch_response: {str(e)}")
+            self.analytics_service.add_error("claude_response", str(e))
+            return "I encountered an error processing your request. Please try again.", None
+
+    async def stream_claude_response(self, user_id: str, message: str, channel_id: int, server_id: str) -> AsyncIterator[str]:
+        await self.conversation_manager.ensure_loaded(channel_id)
+        history = self.conversation_manager.get_messages(channel_id)
+        
+        chunks = []
+        try:
+            async for chunk in self.claude_service.get_stream_response(
+                user_id=user_id,
+                message=message,
+                channel_id=channel_id,
+                server_id=server_id,
+                history=history
+            ):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            self.logger.error(f"Error in stream_claude_response: {str(e)}")
+            self.analytics_service.add_error("claude_response", str(e))
+            if not chunks:
+                yield "I encountered an error processing your request. Please try again."
+                return
+            # Part of the answer is already visible; say it was cut short and
+            # keep what was said so the next turn can pick up from it
+            chunks.append(STREAM_INTERRUPTED_MARKER)
+            yield STREAM_INTERRUPTED_MARKER
+        
+        self.conversation_manager.add_message(channel_id, message, is_bot=False, server_id=server_id, user_id=user_id)
+        self.conversation_manager.add_message(channel_id, "".join(chunks), is_bot=True, server_id=server_id)
+
     async def clear_conversation_context(self, channel_id: int):
         self.conversation_manager.clear_context(channel_id)
 
     async def setup_hook(self):
         try:
+            await self.http_client.start()
+            if self.conversation_persister is not None:
+                try:
+                    await db_manager.init_models()
+                    migrated = await migrate_conversation_messages(db_manager.async_session)
+                    if migrated:
+                        self.logger.info(f"Migrated {migrated} conversation messages out of the JSON column")
+                    await self.conversation_persister.start()
+                except Exception as db_error:
+                    self.logger.error(f"Conversation persistence unavailable: {db_error}")
+                    self.conversation_persister = None
+                    self.conversation_manager.persister = None
             await self.load_allowed_channels()
 
             extensions = [
@@ -103,6 +287,20 @@ class ClaudeBot(commands.Bot):
             self.logger.error(f"Failed during setup: {e}")
             self.logger.error(traceback.format_exc())
 
+    async def close(self):
+        await self.queue_service.close()
+        await self.conversation_manager.close()
+        if self.conversation_persister is not None:
+            try:
+                await self.conversation_persister.close()
+            except Exception as e:
+                self.logger.error(f"Failed to flush conversations: {e}")
+        try:
+            await self.http_client.close()
+        except Exception as e:
+            self.logger.error(f"Failed to close HTTP client: {e}")
+        await super().close()
+
     async def on_ready(self):
         self.logger.info(f"Logged in as {self.user}")
         self.logger.info(f"Connected to {len(self.guilds)} guilds")
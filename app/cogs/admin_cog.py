@@ -116,8 +116,155 @@ class AdminCog(commands.Cog):
         error_rate = self.bot.analytics_service.get_stats()['error_rate']
         embed.add_field(name="Error Rate", value=error_rate, inline=True)
         
+        pool = self.bot.http_client.get_stats()
+        embed.add_field(
+            name="HTTP Pool",
+            value=f"{pool['open_connections']} open / {pool['idle_connections']} idle / {pool['in_use_connections']} in use",
+            inline=True
+        )
+        
+        usage = self.bot.claude_service.get_stats()
+        embed.add_field(
+            name="Prompt Cache",
+            value=f"{usage['prompt_cache_hit_rate']:.0%} hit rate ({usage['cache_read_input_tokens']} tokens read)",
+            inline=True
+        )
+        embed.add_field(
+            name="Deduplicated Calls",
+            value=f"{usage['coalescer_deduplicated']} of {usage['coalescer_requests']}",
+            inline=True
+        )
+        breaker_states = ", ".join(sorted(set(usage['breakers'].values()))) or "closed"
+        embed.add_field(
+            name="API Resilience",
+            value=f"{usage['retries']} retries ({usage['retry_wait_seconds']}s waiting), breaker {breaker_states}",
+            inline=True
+        )
+        queue = self.bot.queue_service.get_stats()
+        admission = self.bot.admission_controller.get_stats()
+        embed.add_field(
+            name="Request Queue",
+            value=(
+                f"{queue['queue_running']} running, {queue['queue_waiting']} waiting "
+                f"({queue['queue_busy_guilds']} busy servers, {queue['queue_workers']} workers), "
+                f"{queue['queue_service_time']:.1f}s per request, "
+                f"{admission['admission_shed'] + queue['queue_rejected']} shed, {queue['queue_expired']} expired"
+            ),
+            inline=True
+        )
+        rate_limits = self.bot.rate_limiter.get_stats()
+        embed.add_field(
+            name="Rate Limits",
+            value=(
+                f"{rate_limits['ratelimit_allowed']} allowed ({rate_limits['ratelimit_waited']} after waiting), "
+                f"{rate_limits['ratelimit_limited']} refused, {rate_limits['ratelimit_keys']} active keys"
+            ),
+            inline=True
+        )
+        claude_cog = self.bot.get_cog('ClaudeCog')
+        if claude_cog is not None and claude_cog.mention_batcher is not None:
+            batching = claude_cog.mention_batcher.get_stats()
+            embed.add_field(
+                name="Mention Batching",
+                value=(
+                    f"{batching['batch_mentions']} mentions in {batching['batch_batches']} batches, "
+                    f"{batching['batch_saved_calls']} calls saved"
+                ),
+                inline=True
+            )
+        if claude_cog is not None:
+            mentions = claude_cog.get_stats()
+            embed.add_field(
+                name="Withdrawn Mentions",
+                value=(
+                    f"{mentions['mentions_skipped']} skipped, {mentions['mentions_cancelled']} cancelled, "
+                    f"{mentions['mentions_retargeted']} edited, "
+                    f"~{mentions['mentions_saved_seconds']:.0f}s saved, "
+                    f"{mentions['dedupe_duplicates']} duplicates ignored"
+                ),
+                inline=True
+            )
+        if 'governor_in_flight' in usage:
+            embed.add_field(
+                name="API Concurrency",
+                value=(
+                    f"{usage['governor_in_flight']}/{usage['governor_concurrency_limit']:.0f} in flight, "
+                    f"{usage['governor_rate_limited']} rate limited"
+                ),
+                inline=True
+            )
+        
+        key_lines = []
+        for key in usage['api_keys']:
+            line = f"{key['key']}: {key['requests']} req, {key['tokens']} tok, {key['rate_limited']}×429"
+            if key['quarantined_for']:
+                line += f" (quarantined {key['quarantined_for']:.0f}s)"
+            key_lines.append(line)
+        embed.add_field(name="API Keys", value="\n".join(key_lines), inline=False)
+        
+        model_lines = [
+            f"{model}: {stats['requests']} req, p50 {stats['p50_latency']:.2f}s, p95 {stats['p95_latency']:.2f}s, "
+            f"{stats['input_tokens']}/{stats['output_tokens']} tok in/out"
+            for model, stats in usage['models'].items()
+        ]
+        if model_lines:
+            embed.add_field(name="Models", value="\n".join(model_lines), inline=False)
+        
+        conversations = self.bot.conversation_manager.get_stats()
+        embed.add_field(
+            name="Conversations",
+            value=(
+                f"{conversations['resident_channels']} channels in memory "
+                f"({conversations['resident_bytes'] // 1024} KiB), {conversations['spilled_channels']} spilled, "
+                f"{conversations['evictions']} evicted, {conversations['rehydrations']} reloaded"
+            ),
+            inline=True
+        )
+        
+        if self.bot.conversation_persister is not None:
+            persist = self.bot.conversation_persister.get_stats()
+            embed.add_field(
+                name="Persistence",
+                value=(
+                    f"{persist['persist_pending']} pending, {persist['persist_flushed']} written "
+                    f"in {persist['persist_flushes']} flushes, {persist['persist_failures']} failed"
+                ),
+                inline=True
+            )
+        
+        if self.bot.response_cache is not None:
+            cache = self.bot.response_cache.get_stats()
+            embed.add_field(
+                name="Response Cache",
+                value=f"{cache['hit_rate']:.0%} hit rate ({cache['entries']} entries, {cache['bytes'] // 1024} KiB)",
+                inline=True
+            )
+        
         await ctx.send(embed=embed)
 
+    @commands.command(name="responsecache")
+    @commands.check(is_admin_or_bot_owner())
+    @global_error_handler
+    async def response_cache(self, ctx, setting: str = None):
+        """Enable or disable cached answers to repeated questions in this server"""
+        cache = self.bot.response_cache
+        if cache is None:
+            await ctx.send("The response cache is not enabled for this bot.")
+            return
+
+        server_id = str(ctx.guild.id)
+        if setting is None:
+            state = "enabled" if cache.is_enabled(server_id) else "disabled"
+            await ctx.send(f"Response cache is {state} for this server.")
+        elif setting.lower() in ('on', 'enable', 'enabled'):
+            cache.set_guild_enabled(server_id, True)
+            await ctx.send("Response cache enabled for this server.")
+        elif setting.lower() in ('off', 'disable', 'disabled'):
+            cache.set_guild_enabled(server_id, False)
+            await ctx.send("Response cache disabled for this server.")
+        else:
+            await ctx.send("Usage: !responsecache [on|off]")
+
     @commands.command(name="setchan")
     @is_admin_or_bot_owner()
     @global_error_handler
@@ -1,13 +1,52 @@
+import asyncio
+import time
 import discord
 from discord.ext import commands
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 from datetime import datetime
 
+from app.services.mention_batcher import MentionBatcher
+from app.services.message_deduplicator import MessageDeduplicator
+from app.services.queue_service import PRIORITY_ADMIN, PRIORITY_MENTION, QueueFullError
+from app.services.rate_limiter import RateLimitExceeded
+from app.services.request_coalescer import upstream_cancellations
 from app.utils.permissions import is_admin_or_bot_owner, global_error_handler
 
+@dataclass
+class Mention:
+    message: discord.Message
+    received_at: datetime
+    received_monotonic: float
+    # Set once the message is deleted or edited away while waiting
+    cancelled: bool = False
+    # Request task and the mentions it answers, once processing started
+    task: Optional[asyncio.Task] = None
+    batch: List["Mention"] = field(default_factory=list)
+
 class ClaudeCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.mention_batcher = None
+        if self.bot.config.mention_batch_window > 0:
+            self.mention_batcher = MentionBatcher(
+                self.enqueue_mentions,
+                window=self.bot.config.mention_batch_window,
+                max_batch=self.bot.config.mention_batch_max
+            )
+
+        # Gateway resumes can deliver the same message again
+        self.deduplicator = MessageDeduplicator(
+            window=self.bot.config.message_dedupe_window,
+            max_entries=self.bot.config.message_dedupe_max_entries
+        )
+
+        # Mentions queued or being answered, by Discord message id
+        self.pending: Dict[int, Mention] = {}
+        self.skipped = 0
+        self.cancelled = 0
+        self.retargeted = 0
+        self.saved_seconds = 0.0
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -15,7 +54,11 @@ class ClaudeCog(commands.Cog):
             return
 
         if self.bot.user in message.mentions:
-            start_time = datetime.now()
+            if self.deduplicator.seen(message.id):
+                self.bot.logger.info(f"Ignoring duplicate delivery of message {message.id}")
+                return
+
+            mention = Mention(message, datetime.now(), time.monotonic())
             
             self.bot.analytics_service.add_mention(
                 message.channel.id,
@@ -35,28 +78,266 @@ class ClaudeCog(commands.Cog):
                 self.bot.logger.info(f"Channel {message.channel.id} not in allowed channels for server {message.guild.id}")
                 return
 
-            async def process_message():
-                async with message.channel.typing():
-                    response = await self.bot.get_claude_response(
-                        str(message.author.id),
-                        message.clean_content,
-                        message.channel.id,
-                        str(message.guild.id)
-                    )
-                    
-                    try:
-                        shared_response = await self.bot.file_share_service.share_long_content(response)
-                        await message.reply(shared_response)
-                    except Exception as e:
-                        self.bot.logger.error(f"Sharing error: {e}")
-                        self.bot.analytics_service.add_error("sharing", str(e))
-                        await message.reply(response[:250] + "...")
-                    
-                    end_time = datetime.now()
-                    response_time = (end_time - start_time).total_seconds()
-                    self.bot.analytics_service.add_response_time(message.channel.id, response_time)
-
-            await self.bot.queue_service.add_task(message.channel.id, process_message)
+            # Registered first, so deleting the message while it waits cancels it
+            self.pending[message.id] = mention
+            if not await self.rate_limit(mention):
+                return
+
+            if self.mention_batcher is not None:
+                await self.mention_batcher.add(message.channel.id, mention)
+            else:
+                await self.enqueue_mentions([mention])
+
+    async def rate_limit(self, mention: "Mention") -> bool:
+        """
+        Wait for the mention's turn under the user, channel, guild and global limits
+
+        :return: False if it was turned away, after telling the author
+        """
+        message = mention.message
+        try:
+            await self.bot.rate_limiter.acquire(
+                {
+                    'user': message.author.id,
+                    'channel': message.channel.id,
+                    'guild': message.guild.id,
+                    'global': None
+                },
+                max_wait=self.bot.config.rate_limit_max_wait
+            )
+        except RateLimitExceeded as e:
+            self.forget([mention])
+            await message.reply(
+                f"You're sending requests too quickly. Please try again in {e.retry_after:.0f} seconds."
+            )
+            return False
+        return True
+
+    async def enqueue_mentions(self, mentions: List["Mention"]):
+        """Admit a mention (or a burst of them from one channel) and queue it as one request"""
+        mentions = [mention for mention in mentions if not mention.cancelled]
+        if not mentions:
+            # Deleted while its batch was still open
+            self.skipped += 1
+            return
+        message = mentions[0].message
+        server_id = str(message.guild.id)
+
+        async def expired():
+            self.forget(mentions)
+            for mention in mentions:
+                if not mention.cancelled:
+                    await mention.message.reply("Sorry, this request waited too long in the queue. Please ask again.")
+
+        # Server admins are served ahead of regular mentions
+        is_admin = any(mention.message.author.guild_permissions.administrator for mention in mentions)
+        priority = PRIORITY_ADMIN if is_admin else PRIORITY_MENTION
+
+        admission = self.bot.admission_controller.check(server_id, priority)
+        if not admission.admitted:
+            self.forget(mentions)
+            for mention in mentions:
+                await mention.message.reply(
+                    f"I'm handling a lot of requests right now. Please try again in about {admission.eta:.0f} seconds."
+                )
+            return
+
+        try:
+            await self.bot.queue_service.add_task(
+                message.channel.id,
+                self.process_mentions,
+                mentions,
+                guild_id=server_id,
+                priority=priority,
+                deadline=self.bot.admission_controller.deadline,
+                on_expired=expired
+            )
+        except QueueFullError:
+            self.forget(mentions)
+            for mention in mentions:
+                await mention.message.reply("I'm handling a lot of requests right now. Please try again in a minute.")
+            return
+
+        if admission.delayed:
+            await message.reply(
+                f"You're #{admission.position} in line, I'll get to this in about {admission.eta:.0f} seconds."
+            )
+
+    def forget(self, mentions: List["Mention"]):
+        for mention in mentions:
+            # An edit may have replaced the entry with a newer mention
+            if self.pending.get(mention.message.id) is mention:
+                del self.pending[mention.message.id]
+
+    async def process_mentions(self, mentions: List["Mention"]):
+        """
+        Answer the mentions that are still live
+
+        The request runs in its own task so deleting or editing the message can
+        cancel it without cancelling the queue worker.
+        """
+        live = [mention for mention in mentions if not mention.cancelled]
+        if not live:
+            # Deleted while queued: the whole call is saved
+            self.skipped += 1
+            self.saved_seconds += self.bot.queue_service.service_time
+            self.forget(mentions)
+            return
+
+        started = time.monotonic()
+        cancellations: List[bool] = []
+        task = asyncio.create_task(self.answer_mentions(live, cancellations))
+        for mention in live:
+            mention.task = task
+            mention.batch = live
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            self.forget(mentions)
+
+        if task.cancelled():
+            self.cancelled += 1
+            # A request shared with other callers keeps running, so nothing is
+            # saved; none reported means it was cancelled before being sent
+            if all(cancellations):
+                self.saved_seconds += max(0.0, self.bot.queue_service.service_time - (time.monotonic() - started))
+        else:
+            task.result()
+
+    async def answer_mentions(self, mentions: List["Mention"], cancellations: Optional[List[bool]] = None):
+        if cancellations is not None:
+            upstream_cancellations.set(cancellations)
+        if len(mentions) > 1:
+            await self.process_batch(mentions)
+        elif self.bot.config.stream_responses:
+            await self.stream_message(mentions[0])
+        else:
+            await self.process_message(mentions[0])
+
+    def cancel_mention(self, mention: "Mention"):
+        """Skip a queued mention, and stop its request once nobody in its batch is left"""
+        mention.cancelled = True
+        self.forget([mention])
+        if mention.task is not None and not mention.task.done():
+            if all(other.cancelled for other in mention.batch):
+                mention.task.cancel()
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        mention = self.pending.get(payload.message_id)
+        if mention is not None:
+            self.cancel_mention(mention)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            mention = self.pending.get(message_id)
+            if mention is not None:
+                self.cancel_mention(mention)
+
+    @commands.Cog.listener()
+    async def on_message_edit(self, before, after):
+        mention = self.pending.get(after.id)
+        if mention is None or before.content == after.content:
+            return
+
+        if self.bot.user not in after.mentions:
+            self.cancel_mention(mention)
+            return
+
+        if mention.task is None:
+            # Still waiting: answer the edited text instead
+            mention.message = after
+            self.retargeted += 1
+        elif len(mention.batch) == 1 and not mention.task.done():
+            # Already answering the old text: stop and queue the new one, which
+            # is a new request and is rate limited like one
+            self.cancel_mention(mention)
+            edited = Mention(after, datetime.now(), time.monotonic())
+            self.pending[after.id] = edited
+            if not await self.rate_limit(edited):
+                return
+            self.retargeted += 1
+            await self.enqueue_mentions([edited])
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'mentions_pending': len(self.pending),
+            'mentions_skipped': self.skipped,
+            'mentions_cancelled': self.cancelled,
+            'mentions_retargeted': self.retargeted,
+            'mentions_saved_seconds': self.saved_seconds,
+            **self.deduplicator.get_stats()
+        }
+
+    async def send_reply(self, message: discord.Message, response: str):
+        try:
+            shared_response = await self.bot.file_share_service.share_long_content(response)
+            await message.reply(shared_response)
+        except Exception as e:
+            self.bot.logger.error(f"Sharing error: {e}")
+            self.bot.analytics_service.add_error("sharing", str(e))
+            await message.reply(response[:250] + "...")
+
+    def record_response_time(self, mention: "Mention"):
+        response_time = (datetime.now() - mention.received_at).total_seconds()
+        self.bot.analytics_service.add_response_time(mention.message.channel.id, response_time)
+
+    async def process_message(self, mention: "Mention"):
+        message = mention.message
+        async with message.channel.typing():
+            response = await self.bot.get_claude_response(
+                str(message.author.id),
+                message.clean_content,
+                message.channel.id,
+                str(message.guild.id)
+            )
+            await self.send_reply(message, response)
+            self.record_response_time(mention)
+
+    async def stream_message(self, mention: "Mention"):
+        message = mention.message
+        async with message.channel.typing():
+            chunks = self.bot.stream_claude_response(
+                str(message.author.id),
+                message.clean_content,
+                message.channel.id,
+                str(message.guild.id)
+            )
+            streamed = await self.bot.stream_reply_service.reply(message, chunks)
+
+            if streamed.first_sent_at is not None:
+                first_token_time = streamed.first_sent_at - mention.received_monotonic
+                self.bot.analytics_service.add_first_token_time(message.channel.id, first_token_time)
+
+            self.record_response_time(mention)
+
+    async def process_batch(self, mentions: List["Mention"]):
+        """Answer a burst of mentions with one call and reply to each with its part"""
+        leader = mentions[0].message
+        async with leader.channel.typing():
+            response, answers = await self.bot.get_claude_batch_response(
+                [
+                    (str(mention.message.author.id), mention.message.author.display_name, mention.message.clean_content)
+                    for mention in mentions
+                ],
+                leader.channel.id,
+                str(leader.guild.id)
+            )
+
+            if answers is None:
+                # Could not attribute the parts, so everyone gets the whole answer once
+                others = " ".join(mention.message.author.mention for mention in mentions[1:])
+                await self.send_reply(leader, f"{others}\n{response}")
+            else:
+                for mention, answer in zip(mentions, answers):
+                    await self.send_reply(mention.message, answer)
+
+            for mention in mentions:
+                self.record_response_time(mention)
 
     @commands.command(name="clear_context")
     @commands.check(is_admin_or_bot_owner())
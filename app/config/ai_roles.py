@@ -1,5 +1,5 @@
 import os
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 import yaml
 
 class AIRoleConfig:
@@ -8,26 +8,70 @@ class AIRoleConfig:
         # Change to store roles per server
         self.server_roles: Dict[str, str] = {}
         self.roles: Dict[str, str] = {}
+        # Optional per-role model routing (model, max_tokens, ...)
+        self.role_routing: Dict[str, Dict[str, Any]] = {}
         self.load_roles()
 
     def load_roles(self):
-        try:
-            with open(self.config_path, 'r') as f:
-                self.roles = yaml.safe_load(f)
-        except Exception as e:
-            print(f"Error loading AI roles: {e}")
-            self.roles = {
-                "default": "You are Claude, an AI assistant. Be helpful and concise.",
-                "concise": "You aim to be direct and brief while maintaining helpfulness.",
-                "creative": "You are focused on creative and imaginative responses.",
-                "academic": "You provide detailed, academic-style responses with citations when possible."
-            }
-            self.save_roles()
+        data = None
+        if os.path.exists(self.config_path):
+            try:
+                with open(self.config_path, 'r') as f:
+                    data = yaml.safe_load(f)
+            except Exception as e:
+                print(f"Error loading AI roles: {e}")
+
+        if isinstance(data, dict):
+            self._parse_roles(data)
+        elif data is not None:
+            print(f"Error loading AI roles: expected a mapping in {self.config_path}")
+
+        if "default" not in self.roles:
+            self.roles = {**self._default_roles(), **self.roles}
+            # Never overwrite a file the user wrote, even one we could not read
+            if not os.path.exists(self.config_path):
+                self.save_roles()
+
+    @staticmethod
+    def _default_roles() -> Dict[str, str]:
+        return {
+            "default": "You are Claude, an AI assistant. Be helpful and concise.",
+            "concise": "You aim to be direct and brief while maintaining helpfulness.",
+            "creative": "You are focused on creative and imaginative responses.",
+            "academic": "You provide detailed, academic-style responses with citations when possible."
+        }
+
+    def _parse_roles(self, data: Dict[str, Any]):
+        """
+        Accept both ``name: prompt`` and ``name: {prompt: ..., model: ..., max_tokens: ...}``
+
+        Invalid entries are skipped with a message; the rest still load.
+        """
+        self.roles = {}
+        self.role_routing = {}
+        for name, value in data.items():
+            if isinstance(value, dict):
+                routing = dict(value)
+                prompt = routing.pop('prompt', None)
+                if not isinstance(prompt, str) or not prompt:
+                    print(f"Skipping AI role {name!r}: missing 'prompt'")
+                    continue
+                self.roles[name] = prompt
+                if routing:
+                    self.role_routing[name] = routing
+            elif isinstance(value, str) and value:
+                self.roles[name] = value
+            else:
+                print(f"Skipping AI role {name!r}: expected a prompt or a mapping with 'prompt'")
 
     def save_roles(self):
         os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+        data = {
+            name: {'prompt': prompt, **self.role_routing[name]} if name in self.role_routing else prompt
+            for name, prompt in self.roles.items()
+        }
         with open(self.config_path, 'w') as f:
-            yaml.dump(self.roles, f)
+            yaml.dump(data, f)
 
     def get_role_prompt(self, server_id: str = None, role_name: str = "default") -> str:
         # If no server_id provided or no specific role set for server, use default
@@ -49,6 +93,10 @@ class AIRoleConfig:
         """Get current role for specific server"""
         return self.server_roles.get(server_id, "default")
 
+    def get_role_routing(self, server_id: str = None) -> Dict[str, Any]:
+        """Get routing options of the role active for a server"""
+        return self.role_routing.get(self.get_server_role(server_id), {})
+
     def add_role(self, name: str, prompt: str):
         self.roles[name] = prompt
         self.save_roles()
@@ -56,4 +104,5 @@ class AIRoleConfig:
     def remove_role(self, name: str):
         if name != "default" and name in self.roles:
             del self.roles[name]
+            self.role_routing.pop(name, None)
             self.save_roles()
@@ -1,10 +1,11 @@
 from .base import Base
-from .models import Conversation, UserProfile
+from .models import Conversation, ConversationMessage, UserProfile
 from .session import DatabaseManager, db_manager
 
 __all__ = [
     'Base', 
     'Conversation', 
+    'ConversationMessage', 
     'UserProfile', 
     'DatabaseManager', 
     'db_manager'
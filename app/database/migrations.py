@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import func, insert, null, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Conversation, ConversationMessage
+
+def _parse_timestamp(value, fallback: datetime) -> datetime:
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return fallback
+
+async def migrate_conversation_messages(
+    session_factory: Callable[[], AsyncSession],
+    batch_size: int = 100
+) -> int:
+    """
+    Move turns stored in the legacy ``conversations.messages`` JSON column into
+    ``conversation_messages``
+
+    Conversations are migrated ``batch_size`` at a time, each batch in its own
+    transaction, and the JSON column is set to NULL once its turns are copied,
+    so the migration is idempotent and can resume after an interruption.
+
+    :return: Number of turns migrated
+    """
+    migrated = 0
+    while True:
+        async with session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(
+                        Conversation.conversation_id,
+                        Conversation.channel_id,
+                        Conversation.server_id,
+                        Conversation.user_id,
+                        Conversation.messages,
+                        Conversation.created_at
+                    )
+                    .where(Conversation.messages.isnot(None))
+                    .limit(batch_size)
+                )
+                conversations = result.all()
+                if not conversations:
+                    return migrated
+
+                ids = [conversation.conversation_id for conversation in conversations]
+                result = await session.execute(
+                    select(ConversationMessage.conversation_id, func.max(ConversationMessage.seq))
+                    .where(ConversationMessage.conversation_id.in_(ids))
+                    .group_by(ConversationMessage.conversation_id)
+                )
+                next_seq = {conversation_id: max_seq + 1 for conversation_id, max_seq in result}
+
+                rows = []
+                for conversation in conversations:
+                    seq = next_seq.get(conversation.conversation_id, 1)
+                    for message in conversation.messages or []:
+                        rows.append({
+                            'conversation_id': conversation.conversation_id,
+                            'seq': seq,
+                            'channel_id': conversation.channel_id,
+                            'server_id': conversation.server_id,
+                            'user_id': message.get('user_id', conversation.user_id),
+                            'role': message.get('role', 'user'),
+                            'content': message.get('content', ''),
+                            'created_at': _parse_timestamp(
+                                message.get('timestamp'),
+                                conversation.created_at or datetime.utcnow()
+                            )
+                        })
+                        seq += 1
+                if rows:
+                    await session.execute(insert(ConversationMessage), rows)
+                # SQL NULL rather than a JSON null, so the row is not picked up again
+                await session.execute(
+                    update(Conversation)
+                    .where(Conversation.conversation_id.in_(ids))
+                    .values(messages=null())
+                )
+                migrated += len(rows)
+
+async def main():
+    from .session import db_manager
+    await db_manager.init_models()
+    migrated = await migrate_conversation_messages(db_manager.async_session)
+    print(f"Migrated {migrated} conversation messages")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -12,12 +12,32 @@ class Conversation(Base):
     channel_id = Column(String, index=True)
     user_id = Column(String, index=True)
     conversation_id = Column(String, unique=True, index=True)
+    # Legacy whole-history column; turns now live in conversation_messages
     messages = Column(JSON)
     context = Column(JSON)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class ConversationMessage(Base):
+    """One turn of a conversation; rows are only ever appended"""
+    __tablename__ = 'conversation_messages'
+
+    conversation_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    # Null for conversations not bound to a channel
+    channel_id = Column(String)
+    server_id = Column(String)
+    user_id = Column(String)
+    role = Column(String(16), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # "Last N turns of a channel" is a backward scan of this index
+        Index('ix_conversation_messages_channel_recent', 'channel_id', 'created_at', 'seq'),
+    )
+
 class UserProfile(Base):
     __tablename__ = 'user_profiles'
 
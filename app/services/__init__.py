@@ -1,11 +1,15 @@
-from .rate_limiter import RateLimiter
+from .rate_limiter import RateLimit, RateLimiter, RateLimitExceeded
 from .claude_service import ClaudeService
 from .file_sharing_service import FileShareService
 from .logging_service import LoggingService
+from .http_client import HttpClientManager
 
 __all__ = [
+    'RateLimit',
     'RateLimiter',
+    'RateLimitExceeded',
     'ClaudeService',
     'FileShareService',
-    'LoggingService'
+    'LoggingService',
+    'HttpClientManager'
 ]
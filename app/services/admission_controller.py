@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.services.queue_service import PRIORITY_MENTION, QueueService
+
+@dataclass
+class AdmissionDecision:
+    admitted: bool
+    # 1-based estimated position in the queue
+    position: int
+    # Estimated seconds until the request starts processing
+    eta: float
+    # Whether the user should be told about the wait right away
+    delayed: bool = False
+
+class AdmissionController:
+    def __init__(
+        self,
+        queue_service: QueueService,
+        deadline: float = 60.0,
+        notify_after: float = 10.0
+    ):
+        """
+        Decide up front whether a request can be served in time
+
+        The wait is estimated from the queue's current backlog and its observed
+        service time. Requests that would not start within ``deadline`` are
+        shed before they are queued, so they never consume API capacity.
+
+        :param queue_service: Queue the requests are scheduled on
+        :param deadline: Longest acceptable wait before processing starts, in seconds
+        :param notify_after: Estimated wait beyond which the user is told their
+            position and ETA immediately
+        """
+        self.queue_service = queue_service
+        self.deadline = deadline
+        self.notify_after = notify_after
+
+        self.admitted = 0
+        self.delayed = 0
+        self.shed = 0
+
+    def check(self, guild_id: Optional[str], priority: int = PRIORITY_MENTION) -> AdmissionDecision:
+        position, eta = self.queue_service.estimate_wait(guild_id, priority)
+        if eta > self.deadline:
+            self.shed += 1
+            return AdmissionDecision(admitted=False, position=position, eta=eta)
+
+        self.admitted += 1
+        delayed = eta >= self.notify_after
+        if delayed:
+            self.delayed += 1
+        return AdmissionDecision(admitted=True, position=position, eta=eta, delayed=delayed)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'admission_admitted': self.admitted,
+            'admission_delayed': self.delayed,
+            'admission_shed': self.shed
+        }
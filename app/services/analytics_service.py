@@ -8,6 +8,7 @@ class AnalyticsService:
         self.max_records = max_records
         self.mentions: List[Dict] = []
         self.response_times: Dict[int, List[float]] = defaultdict(list)
+        self.first_token_times: Dict[int, List[float]] = defaultdict(list)
         self.channel_usage: Dict[int, int] = defaultdict(int)
         self.errors: List[Dict] = []
         self.start_time = datetime.now()
@@ -25,6 +26,9 @@ class AnalyticsService:
     def add_response_time(self, channel_id: int, response_time: float):
         self.response_times[channel_id].append(response_time)
 
+    def add_first_token_time(self, channel_id: int, first_token_time: float):
+        self.first_token_times[channel_id].append(first_token_time)
+
     def add_error(self, error_type: str, error_message: str):
         self.errors.append({
             'timestamp': datetime.now(),
@@ -45,6 +49,11 @@ class AnalyticsService:
             for channel_id, times in self.response_times.items()
         }
 
+        avg_first_token_times = {
+            channel_id: statistics.mean(times) if times else 0
+            for channel_id, times in self.first_token_times.items()
+        }
+
         most_active_channels = sorted(
             self.channel_usage.items(),
             key=lambda x: x[1],
@@ -56,6 +65,7 @@ class AnalyticsService:
             'total_mentions': total_mentions,
             'error_rate': f"{error_rate:.2%}",
             'avg_response_times': avg_response_times,
+            'avg_first_token_times': avg_first_token_times,
             'most_active_channels': most_active_channels,
             'queued_messages': sum(len(self.mentions) for _ in self.mentions),
         }
@@ -0,0 +1,149 @@
+import time
+from dataclasses import dataclass, field
+from typing import Collection, Dict, List, Mapping, Optional, Sequence
+
+@dataclass
+class ApiKeyState:
+    key: str
+    weight: float = 1.0
+    in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    auth_failures: int = 0
+    tokens: int = 0
+    quarantined_until: float = 0.0
+    requests_remaining: Optional[int] = None
+    tokens_remaining: Optional[int] = None
+    # Smooth weighted round-robin counter
+    current_weight: float = field(default=0.0, repr=False)
+
+    @property
+    def label(self) -> str:
+        """Key identifier that is safe to show in Discord"""
+        return f"…{self.key[-4:]}"
+
+    def is_available(self, now: float) -> bool:
+        return self.quarantined_until <= now
+
+class ApiKeyPool:
+    def __init__(
+        self,
+        keys: Sequence[str],
+        weights: Optional[Sequence[float]] = None,
+        rate_limit_quarantine: float = 30.0,
+        auth_quarantine: float = 3600.0
+    ):
+        """
+        Spread Claude calls over several API keys
+
+        Keys are chosen least-loaded first (in-flight calls relative to weight),
+        ties broken by smooth weighted round-robin. Keys answering 429 are
+        quarantined for their retry-after, keys answering 401/403 for much longer.
+
+        :param keys: API keys
+        :param weights: Relative capacity of each key (defaults to equal)
+        :param rate_limit_quarantine: Seconds a rate-limited key is skipped without retry-after
+        :param auth_quarantine: Seconds a rejected key is skipped
+        """
+        if not keys:
+            raise ValueError("At least one API key is required")
+        weights = weights or [1.0] * len(keys)
+        self.keys: List[ApiKeyState] = [
+            ApiKeyState(key=key, weight=float(weight)) for key, weight in zip(keys, weights)
+        ]
+        self._by_key: Dict[str, ApiKeyState] = {state.key: state for state in self.keys}
+        self.rate_limit_quarantine = rate_limit_quarantine
+        self.auth_quarantine = auth_quarantine
+
+    def get(self, key: str) -> ApiKeyState:
+        return self._by_key[key]
+
+    def available_keys(self) -> List[str]:
+        """Keys that are not quarantined, or the one that recovers first if all are"""
+        now = time.monotonic()
+        available = [state.key for state in self.keys if state.is_available(now)]
+        if not available:
+            available = [min(self.keys, key=lambda state: state.quarantined_until).key]
+        return available
+
+    def acquire(self, eligible: Optional[Collection[str]] = None) -> ApiKeyState:
+        """
+        :param eligible: Restrict the choice to these keys, e.g. those with
+            rate-limit budget left
+        """
+        if eligible is not None:
+            candidates = [self._by_key[key] for key in eligible]
+        else:
+            candidates = [self._by_key[key] for key in self.available_keys()]
+
+        least_load = min(state.in_flight / state.weight for state in candidates)
+        candidates = [state for state in candidates if state.in_flight / state.weight == least_load]
+
+        total_weight = sum(state.weight for state in candidates)
+        for state in candidates:
+            state.current_weight += state.weight
+        chosen = max(candidates, key=lambda state: state.current_weight)
+        chosen.current_weight -= total_weight
+
+        chosen.in_flight += 1
+        chosen.requests += 1
+        return chosen
+
+    def release(
+        self,
+        state: ApiKeyState,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        usage: Optional[Mapping] = None
+    ):
+        state.in_flight = max(0, state.in_flight - 1)
+        if usage:
+            state.tokens += (usage.get('input_tokens') or 0) + (usage.get('output_tokens') or 0)
+
+        if status is None or status == 200:
+            return
+
+        state.errors += 1
+        now = time.monotonic()
+        if status == 429:
+            state.rate_limited += 1
+            state.quarantined_until = max(
+                state.quarantined_until,
+                now + (retry_after if retry_after else self.rate_limit_quarantine)
+            )
+        elif status in (401, 403):
+            state.auth_failures += 1
+            state.quarantined_until = now + self.auth_quarantine
+
+    def observe_headers(self, state: ApiKeyState, headers: Mapping[str, str]):
+        for header, attribute in (
+            ('anthropic-ratelimit-requests-remaining', 'requests_remaining'),
+            ('anthropic-ratelimit-tokens-remaining', 'tokens_remaining')
+        ):
+            value = headers.get(header)
+            if value is None:
+                continue
+            try:
+                setattr(state, attribute, int(value))
+            except ValueError:
+                continue
+
+    def get_stats(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                'key': state.label,
+                'weight': state.weight,
+                'in_flight': state.in_flight,
+                'requests': state.requests,
+                'errors': state.errors,
+                'rate_limited': state.rate_limited,
+                'auth_failures': state.auth_failures,
+                'tokens': state.tokens,
+                'requests_remaining': state.requests_remaining,
+                'tokens_remaining': state.tokens_remaining,
+                'quarantined_for': round(max(0.0, state.quarantined_until - now), 1)
+            }
+            for state in self.keys
+        ]
@@ -1,25 +1,266 @@
 import json
-import asyncio
+import time
 import aiohttp
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from app.config.ai_roles import AIRoleConfig
+from app.services.http_client import HttpClientManager
+from app.services.conversation_manager import estimate_tokens
+from app.services.response_cache import ResponseCache
+from app.services.request_coalescer import RequestCoalescer
+from app.services.resilience import ClaudeAPIError, ResilientCaller, parse_retry_after
+from app.services.concurrency_governor import ConcurrencyGovernor
+from app.services.api_key_pool import ApiKeyPool
+from app.services.model_router import ModelRouter, RoutingDecision
 import os
+from contextlib import asynccontextmanager
+
+ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
+
+async def iter_sse_events(stream: aiohttp.StreamReader) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Parse a server-sent event stream into (event, data) pairs
+
+    Events are separated by a blank line; multi-line ``data:`` fields are
+    joined with newlines as the SSE spec requires.
+    """
+    event = None
+    data_lines: List[str] = []
+
+    async for raw_line in stream:
+        line = raw_line.decode('utf-8').rstrip('\r\n')
+
+        if not line:
+            if data_lines:
+                try:
+                    payload = json.loads("\n".join(data_lines))
+                except json.JSONDecodeError:
+                    payload = {}
+                yield event or payload.get("type", "message"), payload
+            event = None
+            data_lines = []
+            continue
+
+        if line.startswith(':'):
+            continue
+
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data_lines.append(value)
+
+    if data_lines:
+        try:
+            payload = json.loads("\n".join(data_lines))
+        except json.JSONDecodeError:
+            payload = {}
+        yield event or payload.get("type", "message"), payload
 
 class ClaudeService:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the Claude service with API key"""
-        self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        http_client: Optional[HttpClientManager] = None,
+        request_timeout: float = 30.0,
+        api_url: Optional[str] = None,
+        prompt_caching: bool = True,
+        prompt_cache_min_tokens: int = 1024,
+        response_cache: Optional[ResponseCache] = None,
+        resilience: Optional[ResilientCaller] = None,
+        governor: Optional[ConcurrencyGovernor] = None,
+        api_keys: Optional[List[str]] = None,
+        router: Optional[ModelRouter] = None,
+        summary_model: Optional[str] = None
+    ):
+        """Initialize the Claude service with one API key or a pool of keys"""
+        keys = [key for key in (api_keys or []) if key]
+        if not keys:
+            keys = [api_key or os.getenv('ANTHROPIC_API_KEY')]
+        self.api_key = keys[0]
         if not self.api_key:
             raise ValueError("No API key provided for Claude service")
+        self.key_pool = ApiKeyPool(keys)
+        
+        # Shared keep-alive pool; the bot owns its lifecycle
+        self.http_client = http_client or HttpClientManager()
+        self.request_timeout = aiohttp.ClientTimeout(total=request_timeout)
+        # Streams may legitimately run longer than a single request, so only
+        # bound the gap between chunks
+        self.stream_timeout = aiohttp.ClientTimeout(total=None, sock_read=request_timeout)
         
-        self.model = "claude-3-5-haiku-20241022"
-        self.max_tokens = 1000
+        self.router = router or ModelRouter()
+        self.model = self.router.default_model
+        self.max_tokens = self.router.default_max_tokens
+        # Background summarization uses the fast model unless overridden
+        self.summary_model = summary_model
         self.headers = {
             "anthropic-version": "2023-06-01",
             "content-type": "application/json",
             "x-api-key": self.api_key
         }
         self.role_config = AIRoleConfig()
+        self.api_url = api_url or os.getenv('ANTHROPIC_API_URL', ANTHROPIC_API_URL)
+        
+        # Prefixes shorter than the API minimum are not cached, so marking
+        # them only adds noise to the request
+        self.prompt_caching = prompt_caching
+        self.prompt_cache_min_tokens = prompt_cache_min_tokens
+        # Opt-in cache of full responses for repeated questions
+        self.response_cache = response_cache
+        # Identical requests already in flight are awaited, not re-sent
+        self.coalescer = RequestCoalescer()
+        self.resilience = resilience or ResilientCaller()
+        # Process-wide RPM/TPM and concurrency budget; None leaves calls unbounded
+        self.governor = governor
+        self.usage_stats: Dict[str, int] = {
+            'requests': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_read_input_tokens': 0,
+            'cache_creation_input_tokens': 0,
+            'prompt_cache_hits': 0,
+            'prompt_cache_misses': 0
+        }
+
+    def _build_messages(
+        self,
+        message: str,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """Append the new user turn to prior turns, keeping roles alternating"""
+        messages = [dict(turn) for turn in history or []]
+        if messages and messages[-1]["role"] == "user":
+            messages[-1]["content"] += f"\n\n{message}"
+        else:
+            messages.append({"role": "user", "content": message})
+        return messages
+
+    def _build_payload(
+        self,
+        system_prompt: str,
+        messages: List[Dict],
+        max_tokens: int,
+        stream: bool = False,
+        model: Optional[str] = None
+    ) -> Dict:
+        """
+        Assemble a Messages API request, marking stable prefixes as cacheable
+
+        Up to two cache breakpoints are used: the role system prompt and the
+        last turn of prior history (everything before the new user message).
+        The API ignores breakpoints on prefixes shorter than
+        ``prompt_cache_min_tokens`` (1024, or 2048 for Haiku models). Role
+        prompts are usually far shorter, so they get cached as part of the
+        history prefix, which the conversation manager keeps stable by
+        sliding its window in whole chunks.
+        """
+        system = system_prompt
+        if self.prompt_caching:
+            prefix_tokens = estimate_tokens(system_prompt)
+            if prefix_tokens >= self.prompt_cache_min_tokens:
+                system = [{
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"}
+                }]
+
+            for turn in messages[:-1]:
+                prefix_tokens += estimate_tokens(turn["content"])
+            if len(messages) > 1 and prefix_tokens >= self.prompt_cache_min_tokens:
+                stable = messages[-2]
+                messages = messages[:-2] + [{
+                    "role": stable["role"],
+                    "content": [{
+                        "type": "text",
+                        "text": stable["content"],
+                        "cache_control": {"type": "ephemeral"}
+                    }]
+                }] + messages[-1:]
+
+        data = {
+            "model": model or self.model,
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "messages": messages,
+            "system": system
+        }
+        if stream:
+            data["stream"] = True
+        return data
+
+    def _record_usage(self, usage: Optional[Dict], model: Optional[str] = None):
+        """Accumulate token usage and prompt cache hit/miss counts"""
+        if not usage:
+            return
+        self.router.record_usage(model or self.model, usage)
+        stats = self.usage_stats
+        stats['requests'] += 1
+        stats['input_tokens'] += usage.get('input_tokens') or 0
+        stats['output_tokens'] += usage.get('output_tokens') or 0
+
+        cache_read = usage.get('cache_read_input_tokens') or 0
+        cache_created = usage.get('cache_creation_input_tokens') or 0
+        stats['cache_read_input_tokens'] += cache_read
+        stats['cache_creation_input_tokens'] += cache_created
+        if cache_read:
+            stats['prompt_cache_hits'] += 1
+        elif cache_created:
+            stats['prompt_cache_misses'] += 1
+
+    def get_stats(self) -> Dict:
+        """Usage counters including prompt cache effectiveness"""
+        stats = dict(self.usage_stats)
+        lookups = stats['prompt_cache_hits'] + stats['prompt_cache_misses']
+        stats['prompt_cache_hit_rate'] = stats['prompt_cache_hits'] / lookups if lookups else 0.0
+        stats.update(self.coalescer.get_stats())
+        stats.update(self.resilience.get_stats())
+        if self.governor is not None:
+            stats.update(self.governor.get_stats())
+        stats['api_keys'] = self.key_pool.get_stats()
+        stats.update(self.router.get_stats())
+        return stats
+
+    def _cache_key(
+        self,
+        system_prompt: str,
+        message: str,
+        server_id: Optional[str],
+        history: Optional[List[Dict[str, str]]],
+        decision: RoutingDecision
+    ) -> Optional[str]:
+        """Response cache key, or None when caching does not apply"""
+        if self.response_cache is None or not self.response_cache.is_enabled(server_id):
+            return None
+        return self.response_cache.make_key(
+            system_prompt,
+            message,
+            history,
+            model=decision.model,
+            max_tokens=decision.max_tokens
+        )
+
+    def _route(
+        self,
+        system_prompt: str,
+        messages: List[Dict[str, str]],
+        server_id: Optional[str],
+        max_tokens: Optional[int]
+    ) -> RoutingDecision:
+        """Choose model and output budget; an explicit ``max_tokens`` wins"""
+        prompt_tokens = estimate_tokens(system_prompt) + sum(
+            estimate_tokens(turn["content"]) for turn in messages
+        )
+        decision = self.router.route(
+            self.role_config.get_role_routing(server_id),
+            prompt_tokens,
+            server_id
+        )
+        if max_tokens is not None:
+            decision.max_tokens = max_tokens
+        return decision
 
     async def get_response(
         self,
@@ -27,43 +268,50 @@ class ClaudeService:
         message: str,
         channel_id: int,
         server_id: str = None,
-        max_tokens: int = 1000
+        max_tokens: Optional[int] = None,
+        history: Optional[List[Dict[str, str]]] = None
     ) -> str:
-        """Get a response from Claude"""
+        """
+        Get a response from Claude
+
+        Errors are raised rather than returned as text, so callers never
+        mistake a failure for an answer and store it in the history.
+        """
         try:
             system_prompt = self.role_config.get_role_prompt(server_id)
             
-            data = {
-                "model": self.model,
-                "max_tokens": max_tokens,
-                "temperature": 0.7,
-                "messages": [{
-                    "role": "user",
-                    "content": message
-                }],
-                "system": system_prompt
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers=self.headers,
-                    json=data,
-                    timeout=30
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"API Error {response.status}: {error_text}")
-                    
-                    response_data = await response.json()
-                    if 'content' not in response_data or not response_data['content']:
-                        raise Exception("Empty response from API")
-                    
-                    return response_data['content'][0]['text']
+            messages = self._build_messages(message, history)
+            decision = self._route(system_prompt, messages, server_id, max_tokens)
+
+            cache_key = self._cache_key(system_prompt, message, server_id, history, decision)
+            if cache_key is not None:
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
+            data = self._build_payload(
+                system_prompt,
+                messages,
+                decision.max_tokens,
+                model=decision.model
+            )
+
+            key = self.coalescer.make_key(data)
+            started = time.monotonic()
+            response_data = await self.coalescer.run(
+                key,
+                lambda: self.resilience.call(self.api_url, lambda: self._post_message(data))
+            )
+            self.router.record_latency(decision.model, time.monotonic() - started)
+            
+            text = response_data['content'][0]['text']
+            if cache_key is not None:
+                self.response_cache.put(cache_key, text)
+            return text
 
         except Exception as e:
             print(f"Error in Claude service: {str(e)}")
-            return f"I encountered an error: {str(e)}"
+            raise
 
     async def get_stream_response(
         self,
@@ -71,39 +319,204 @@ class ClaudeService:
         message: str,
         channel_id: int,
         server_id: str = None,
-        max_tokens: int = 1000
-    ) -> asyncio.StreamReader:
-        """Get a streaming response from Claude"""
+        max_tokens: Optional[int] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[str]:
+        """Stream a response from Claude, yielding text deltas as they arrive"""
+        system_prompt = self.role_config.get_role_prompt(server_id)
+        
+        messages = self._build_messages(message, history)
+        decision = self._route(system_prompt, messages, server_id, max_tokens)
+
+        cache_key = self._cache_key(system_prompt, message, server_id, history, decision)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        data = self._build_payload(
+            system_prompt,
+            messages,
+            decision.max_tokens,
+            stream=True,
+            model=decision.model
+        )
+
         try:
-            system_prompt = self.role_config.get_role_prompt(server_id)
-            
-            data = {
-                "model": self.model,
-                "max_tokens": max_tokens,
-                "temperature": 0.7,
-                "messages": [{
-                    "role": "user",
-                    "content": message
-                }],
-                "system": system_prompt,
-                "stream": True
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers=self.headers,
-                    json=data,
-                    timeout=30
-                ) as response:
-                    if response.status != 200:
-                        raise Exception(f"API Error: {response.status}")
-                    return response.content
+            key = self.coalescer.make_key(data)
+            started = time.monotonic()
+            chunks = self.coalescer.stream(
+                key,
+                lambda: self.resilience.stream(self.api_url, lambda: self._stream_message(data, cache_key))
+            )
+            async for chunk in chunks:
+                yield chunk
+            self.router.record_latency(decision.model, time.monotonic() - started)
 
         except Exception as e:
             print(f"Error in Claude streaming service: {str(e)}")
             raise
 
+    async def _raise_for_status(self, response: aiohttp.ClientResponse):
+        error_text = await response.text()
+        raise ClaudeAPIError(
+            response.status,
+            error_text,
+            retry_after=parse_retry_after(response.headers),
+            headers=dict(response.headers)
+        )
+
+    def _estimate_request_tokens(self, data: Dict) -> int:
+        """Upper-bound token cost of a request, used before usage is known"""
+        system = data.get("system", "")
+        if isinstance(system, list):
+            system = "".join(block.get("text", "") for block in system)
+        tokens = estimate_tokens(system)
+        for turn in data.get("messages", []):
+            content = turn["content"]
+            if isinstance(content, list):
+                content = "".join(block.get("text", "") for block in content)
+            tokens += estimate_tokens(content)
+        return tokens + data.get("max_tokens", self.max_tokens)
+
+    @asynccontextmanager
+    async def _admission(self, data: Dict) -> AsyncIterator[Dict]:
+        """
+        Hold a governor slot and an API key for one HTTP attempt
+
+        Yields a dict carrying the request ``headers``; the caller records the
+        response ``status``, ``retry_after`` and ``usage`` in it so the governor
+        and key pool can account for the attempt on release.
+        """
+        outcome: Dict = {'usage': None, 'status': None, 'retry_after': None}
+        permit = None
+        if self.governor is not None:
+            # Each key has its own budget; the pool balances among those with room
+            permit = await self.governor.acquire(
+                self._estimate_request_tokens(data),
+                keys=self.key_pool.available_keys(),
+                choose=lambda ready: self.key_pool.acquire(ready).key
+            )
+            key_state = self.key_pool.get(permit.key)
+        else:
+            key_state = self.key_pool.acquire()
+        outcome['key'] = key_state
+        outcome['headers'] = {**self.headers, "x-api-key": key_state.key}
+        try:
+            yield outcome
+        finally:
+            self.key_pool.release(
+                key_state,
+                status=outcome['status'],
+                retry_after=outcome['retry_after'],
+                usage=outcome['usage']
+            )
+            if permit is not None:
+                await self.governor.release(permit, outcome['usage'], outcome['status'] == 429)
+
+    def _observe_response(self, response: aiohttp.ClientResponse, outcome: Dict):
+        outcome['status'] = response.status
+        outcome['retry_after'] = parse_retry_after(response.headers)
+        self.key_pool.observe_headers(outcome['key'], response.headers)
+        if self.governor is None:
+            return
+        self.governor.observe_headers(response.headers, key=outcome['key'].key)
+        if response.status == 429:
+            self.governor.on_rate_limited(outcome['retry_after'], key=outcome['key'].key)
+
+    async def _post_message(self, data: Dict) -> Dict:
+        """Send a single non-streaming Messages API request"""
+        async with self._admission(data) as outcome:
+            session = await self.http_client.get_session()
+            async with session.post(
+                self.api_url,
+                headers=outcome['headers'],
+                json=data,
+                timeout=self.request_timeout
+            ) as response:
+                self._observe_response(response, outcome)
+                if response.status != 200:
+                    await self._raise_for_status(response)
+                
+                response_data = await response.json()
+                outcome['usage'] = response_data.get('usage')
+                self._record_usage(outcome['usage'], data["model"])
+                if 'content' not in response_data or not response_data['content']:
+                    raise Exception("Empty response from API")
+                
+                return response_data
+
+    async def _stream_message(self, data: Dict, cache_key: Optional[str] = None) -> AsyncIterator[str]:
+        """Send a streaming Messages API request and yield its text deltas"""
+        async with self._admission(data) as outcome:
+            session = await self.http_client.get_session()
+            async with session.post(
+                self.api_url,
+                headers=outcome['headers'],
+                json=data,
+                timeout=self.stream_timeout
+            ) as response:
+                self._observe_response(response, outcome)
+                if response.status != 200:
+                    await self._raise_for_status(response)
+
+                usage: Dict = {}
+                outcome['usage'] = usage
+                chunks: List[str] = []
+                completed = False
+                async for event, payload in iter_sse_events(response.content):
+                    if event == "message_start":
+                        usage.update(payload.get("message", {}).get("usage") or {})
+                    elif event == "message_delta":
+                        usage.update(payload.get("usage") or {})
+                    elif event == "content_block_delta":
+                        delta = payload.get("delta", {})
+                        if delta.get("type") == "text_delta" and delta.get("text"):
+                            chunks.append(delta["text"])
+                            yield delta["text"]
+                    elif event == "error":
+                        error = payload.get("error", {})
+                        raise Exception(f"Stream error: {error.get('message', payload)}")
+                    elif event == "message_stop":
+                        completed = True
+                        break
+                self._record_usage(usage, data["model"])
+
+                if cache_key is not None and completed and chunks:
+                    self.response_cache.put(cache_key, "".join(chunks))
+
+    async def summarize_conversation(
+        self,
+        previous_summary: str,
+        turns: List[Dict[str, str]],
+        max_tokens: int = 400
+    ) -> str:
+        """
+        Fold older conversation turns into a running summary using the fast model
+
+        Raises on failure so callers never store an error message as a summary.
+        """
+        transcript = "\n".join(
+            f"{'Assistant' if turn['role'] == 'assistant' else 'User'}: {turn['content']}"
+            for turn in turns
+        )
+        prompt = (
+            f"Existing summary:\n{previous_summary or '(none)'}\n\n"
+            f"New conversation turns:\n{transcript}\n\n"
+            "Update the summary so it covers both. Keep names, decisions, open questions "
+            "and facts needed to continue the conversation. Reply with the summary only."
+        )
+        data = {
+            "model": self.summary_model or self.router.fast_model,
+            "max_tokens": max_tokens,
+            "temperature": 0.2,
+            "system": "You maintain concise running summaries of Discord conversations.",
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        response_data = await self.resilience.call(self.api_url, lambda: self._post_message(data))
+        return response_data['content'][0]['text'].strip()
+
     def validate_response(self, response: str) -> bool:
         """Validate Claude's response"""
         if not response or len(response.strip()) == 0:
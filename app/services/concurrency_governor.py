@@ -0,0 +1,215 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Mapping, Optional, Sequence
+
+class _Bucket:
+    def __init__(self, capacity: float):
+        """Continuously refilling budget of ``capacity`` units per minute"""
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+class _KeyBudget:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        """RPM/TPM budget and 429 pause of one API key"""
+        self.requests = _Bucket(requests_per_minute)
+        self.tokens = _Bucket(tokens_per_minute)
+        self.paused_until = 0.0
+
+    def refill(self, now: float):
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+    def delay(self, estimated_tokens: int, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.seconds_until(1),
+            self.tokens.seconds_until(estimated_tokens)
+        )
+
+@dataclass
+class Permit:
+    estimated_tokens: int
+    acquired_at: float
+    # API key whose budget the call was charged to
+    key: Optional[Hashable] = None
+    released: bool = False
+
+class ConcurrencyGovernor:
+    def __init__(
+        self,
+        requests_per_minute: int = 50,
+        tokens_per_minute: int = 50000,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1
+    ):
+        """
+        Process-wide admission for Claude calls across every channel
+
+        Enforces requests-per-minute and tokens-per-minute budgets per API key,
+        so every key in a pool adds its own limits, and adapts the concurrency
+        limit AIMD-style: additive increase on success, multiplicative decrease
+        on 429s that leave no key to fall back on.
+
+        :param requests_per_minute: Request budget of each key
+        :param tokens_per_minute: Token budget of each key (estimated up front,
+            reconciled from usage)
+        :param max_concurrency: Upper bound for simultaneous calls
+        :param min_concurrency: Lower bound the limit never drops below
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._budgets: Dict[Optional[Hashable], _KeyBudget] = {}
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+        self.admitted = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+    def _budget(self, key: Optional[Hashable]) -> _KeyBudget:
+        budget = self._budgets.get(key)
+        if budget is None:
+            budget = self._budgets[key] = _KeyBudget(self.requests_per_minute, self.tokens_per_minute)
+        return budget
+
+    def _ready(self, keys: Sequence[Optional[Hashable]], estimated_tokens: int, now: float):
+        """
+        Keys that could take the call now, and the seconds until one could if none can
+        """
+        ready: List[Optional[Hashable]] = []
+        delay = None
+        for key in keys:
+            budget = self._budget(key)
+            budget.refill(now)
+            key_delay = budget.delay(estimated_tokens, now)
+            if key_delay <= 0:
+                ready.append(key)
+            elif delay is None or key_delay < delay:
+                delay = key_delay
+        return ready, delay
+
+    async def acquire(
+        self,
+        estimated_tokens: int,
+        keys: Optional[Sequence[Hashable]] = None,
+        choose: Optional[Callable[[List[Hashable]], Hashable]] = None
+    ) -> Permit:
+        """
+        Wait until a call estimated at ``estimated_tokens`` fits a concurrency
+        slot and the budget of one of ``keys``
+
+        :param keys: API keys the call may use; a single shared budget if None
+        :param choose: Picks the key to charge among those with budget left,
+            e.g. the key pool's load balancer; the first one by default
+        """
+        keys = list(keys) if keys else [None]
+        started = time.monotonic()
+        async with self._condition:
+            while True:
+                now = time.monotonic()
+                ready, delay = self._ready(keys, estimated_tokens, now)
+                if ready and self.in_flight < int(self.concurrency_limit):
+                    break
+                try:
+                    # Budgets refill on their own; slots are announced by release
+                    await asyncio.wait_for(self._condition.wait(), timeout=None if ready else delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            key = choose(ready) if choose is not None else ready[0]
+            budget = self._budget(key)
+            budget.requests.level -= 1
+            budget.tokens.level -= estimated_tokens
+            self.in_flight += 1
+            self.admitted += 1
+
+        self.wait_seconds += time.monotonic() - started
+        return Permit(estimated_tokens=estimated_tokens, acquired_at=time.monotonic(), key=key)
+
+    async def release(self, permit: Permit, usage: Optional[Mapping] = None, rate_limited: bool = False):
+        """
+        Return a slot and reconcile the token estimate with actual ``usage``
+        """
+        if permit.released:
+            return
+        permit.released = True
+
+        async with self._condition:
+            self.in_flight -= 1
+            if usage:
+                actual = (
+                    (usage.get('input_tokens') or 0)
+                    + (usage.get('cache_creation_input_tokens') or 0)
+                    + (usage.get('output_tokens') or 0)
+                )
+                # Over-estimates are refunded, under-estimates become debt
+                tokens = self._budget(permit.key).tokens
+                tokens.level = min(tokens.capacity, tokens.level + permit.estimated_tokens - actual)
+
+            now = time.monotonic()
+            if rate_limited and all(
+                budget.paused_until > now for key, budget in self._budgets.items() if key != permit.key
+            ):
+                # Only back off when no other key can absorb the load
+                self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+            else:
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + 1 / max(self.concurrency_limit, 1.0)
+                )
+            self._condition.notify_all()
+
+    def on_rate_limited(self, retry_after: Optional[float] = None, key: Optional[Hashable] = None):
+        """
+        Record a 429 and pause the key that got it for the server's retry-after
+        """
+        self.rate_limited += 1
+        if retry_after:
+            budget = self._budget(key)
+            budget.paused_until = max(budget.paused_until, time.monotonic() + retry_after)
+
+    def observe_headers(self, headers: Mapping[str, str], key: Optional[Hashable] = None):
+        """
+        Clamp the key's local budgets to what the API reports as remaining for it
+        """
+        budget = self._budget(key)
+        budget.refill(time.monotonic())
+        for header, bucket in (
+            ('anthropic-ratelimit-requests-remaining', budget.requests),
+            ('anthropic-ratelimit-tokens-remaining', budget.tokens)
+        ):
+            value = headers.get(header)
+            if value is None:
+                continue
+            try:
+                bucket.level = min(bucket.level, float(value))
+            except ValueError:
+                continue
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        for budget in self._budgets.values():
+            budget.refill(now)
+        return {
+            'governor_in_flight': self.in_flight,
+            'governor_concurrency_limit': round(self.concurrency_limit, 2),
+            'governor_admitted': self.admitted,
+            'governor_rate_limited': self.rate_limited,
+            'governor_wait_seconds': round(self.wait_seconds, 2),
+            'governor_requests_available': int(sum(budget.requests.level for budget in self._budgets.values())),
+            'governor_tokens_available': int(sum(budget.tokens.level for budget in self._budgets.values()))
+        }
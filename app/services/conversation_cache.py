@@ -1,19 +1,126 @@
+import sys
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, Optional, List
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Dict, Optional, List
+
+if TYPE_CHECKING:
+    from app.services.conversation_persister import ConversationPersister
+
+class CachedMessage:
+    """
+    Compact stored message
+
+    Role and user id are interned so each conversation shares one string per
+    participant, and the timestamp is kept as an epoch float. Keys other than
+    role/content are kept in ``extra`` only when present.
+    """
+    __slots__ = ('role', 'content', 'timestamp', 'user_id', 'extra')
+
+    def __init__(self, message: Dict[str, Any], user_id: str, timestamp: float):
+        extra = {key: value for key, value in message.items() if key not in ('role', 'content')}
+        self.role = sys.intern(message.get('role', 'user'))
+        self.content = message.get('content', '')
+        self.timestamp = timestamp
+        self.user_id = sys.intern(str(user_id))
+        self.extra = extra or None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **(self.extra or {}),
+            'role': self.role,
+            'content': self.content,
+            'timestamp': datetime.utcfromtimestamp(self.timestamp).isoformat(),
+            'user_id': self.user_id
+        }
 
 class ConversationCache:
     def __init__(
         self, 
         max_conversations: int = 100, 
-        max_age_hours: int = 24
+        max_age_hours: int = 24,
+        l2: Optional["ConversationPersister"] = None,
+        l2_load_limit: int = 100
     ):
-        # In-memory conversation storage
-        self._conversations: Dict[str, Dict] = {}
-        # Track last interaction for each conversation
-        self._last_interactions: Dict[str, datetime] = {}
+        """
+        Conversation cache with a bounded in-memory L1 over an optional database L2
+
+        L2 is a ``ConversationPersister`` built on ``DatabaseManager``'s session
+        factory rather than ``DatabaseManager`` itself, so write-through shares
+        the persister's batched, append-only writes and never blocks ``add_message``.
+
+        The bot does not use this cache: channel history goes through
+        ``ConversationManager``, which persists through the same persister. It
+        is kept for conversations not bound to a channel.
+
+        :param max_conversations: Conversations kept in L1
+        :param max_age_hours: Inactivity after which a conversation leaves L1
+        :param l2: Persister used as L2; new messages are written through to it
+            asynchronously and L1 misses are read through from it
+        :param l2_load_limit: Most recent messages loaded into L1 on a read-through
+        """
+        # In-memory conversation storage, least recently active first
+        self._conversations: "OrderedDict[str, Dict]" = OrderedDict()
+        # Track last interaction (time.monotonic()) for each conversation
+        self._last_interactions: Dict[str, float] = {}
+        # Conversation ids of each server, least recently active first
+        self._by_server: Dict[str, "OrderedDict[str, None]"] = {}
         self._max_conversations = max_conversations
-        self._max_age = timedelta(hours=max_age_hours)
+        self._max_age = max_age_hours * 3600
+
+        self.l2 = l2
+        self.l2_load_limit = l2_load_limit
+        self.l1_hits = 0
+        self.l1_misses = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    def _insert(self, conversation_id: str, server_id: str, user_id: str, messages: List[CachedMessage]):
+        self._conversations[conversation_id] = {
+            'server_id': server_id,
+            'user_id': user_id,
+            'messages': messages,
+            'context': {}
+        }
+        self._by_server.setdefault(server_id, OrderedDict())[conversation_id] = None
+        self._last_interactions[conversation_id] = time.monotonic()
+
+    async def _read_through(self, conversation_id: str) -> bool:
+        """
+        Load a conversation missing from L1 out of L2
+
+        :return: Whether the conversation is now in L1
+        """
+        self.l1_misses += 1
+        if self.l2 is None:
+            return False
+        try:
+            stored = await self.l2.load_conversation(conversation_id, self.l2_load_limit)
+        except Exception as e:
+            self.l2_errors += 1
+            print(f"Error reading conversation {conversation_id} from the database: {e}")
+            return False
+
+        if stored is None:
+            self.l2_misses += 1
+            return False
+        self.l2_hits += 1
+        # Another caller may have loaded it while we waited
+        if conversation_id not in self._conversations:
+            self._insert(
+                conversation_id,
+                stored['server_id'],
+                stored['user_id'],
+                [
+                    CachedMessage({'role': turn.role, 'content': turn.content}, turn.user_id or '', turn.timestamp)
+                    for turn in stored['turns']
+                ]
+            )
+            self._prune_conversations()
+        return conversation_id in self._conversations
 
     async def add_message(
         self, 
@@ -28,26 +135,35 @@ class ConversationCache:
         # Generate conversation ID if not provided
         if not conversation_id:
             conversation_id = str(uuid.uuid4())
+        elif conversation_id in self._conversations:
+            self.l1_hits += 1
+        else:
+            await self._read_through(conversation_id)
 
         # Initialize conversation if not exists
         if conversation_id not in self._conversations:
-            self._conversations[conversation_id] = {
-                'server_id': server_id,
-                'user_id': user_id,
-                'messages': [],
-                'context': {}
-            }
+            self._insert(conversation_id, server_id, user_id, [])
+        else:
+            # Keep both orderings sorted by last interaction
+            self._conversations.move_to_end(conversation_id)
+            self._by_server[self._conversations[conversation_id]['server_id']].move_to_end(conversation_id)
 
         # Add message to conversation
-        full_message = {
-            **message,
-            'timestamp': datetime.utcnow().isoformat(),
-            'user_id': user_id
-        }
-        self._conversations[conversation_id]['messages'].append(full_message)
+        cached = CachedMessage(message, user_id, time.time())
+        self._conversations[conversation_id]['messages'].append(cached)
+        if self.l2 is not None:
+            # Write-through is buffered and flushed by the persister in the background
+            self.l2.enqueue_turn(
+                conversation_id,
+                cached.role,
+                cached.content,
+                server_id=self._conversations[conversation_id]['server_id'],
+                user_id=cached.user_id,
+                timestamp=cached.timestamp
+            )
         
         # Update last interaction timestamp
-        self._last_interactions[conversation_id] = datetime.utcnow()
+        self._last_interactions[conversation_id] = time.monotonic()
 
         # Prune old conversations
         self._prune_conversations()
@@ -63,6 +179,11 @@ class ConversationCache:
         """
         Retrieve conversation with context
         """
+        if conversation_id in self._conversations:
+            self.l1_hits += 1
+        else:
+            await self._read_through(conversation_id)
+
         # Check if conversation exists and matches server
         if (conversation_id in self._conversations and 
             self._conversations[conversation_id]['server_id'] == server_id):
@@ -70,9 +191,9 @@ class ConversationCache:
             conversation = self._conversations[conversation_id]
             return {
                 'conversation_id': conversation_id,
-                'messages': conversation['messages'][-max_messages:],
+                'messages': [msg.to_dict() for msg in conversation['messages'][-max_messages:]],
                 'context': conversation.get('context', {}),
-                'last_interaction': self._last_interactions.get(conversation_id)
+                'last_interaction': self._last_interaction(conversation)
             }
         
         return None
@@ -85,46 +206,86 @@ class ConversationCache:
         """
         Retrieve recent conversations for a server
         """
-        # Filter conversations by server and sort by last interaction
-        recent_convos = [
+        # The server index is already ordered by interaction, newest last
+        recent_ids = list(islice(reversed(self._by_server.get(server_id, {})), limit))
+
+        # Fill up from conversations that only live in L2
+        if self.l2 is not None and len(recent_ids) < limit:
+            try:
+                stored_ids = await self.l2.recent_conversation_ids(server_id, limit)
+            except Exception as e:
+                self.l2_errors += 1
+                print(f"Error listing conversations of server {server_id}: {e}")
+                stored_ids = []
+            for conv_id in stored_ids:
+                if len(recent_ids) >= limit:
+                    break
+                if conv_id not in recent_ids and (
+                    conv_id in self._conversations or await self._read_through(conv_id)
+                ):
+                    recent_ids.append(conv_id)
+
+        return [
             {
                 'conversation_id': conv_id,
-                'messages': conv_data['messages'],
-                'last_interaction': self._last_interactions.get(conv_id)
+                'messages': [msg.to_dict() for msg in self._conversations[conv_id]['messages']],
+                'last_interaction': self._last_interaction(self._conversations[conv_id])
             }
-            for conv_id, conv_data in self._conversations.items()
-            if conv_data['server_id'] == server_id
+            for conv_id in recent_ids
+            if conv_id in self._conversations
         ]
-        
-        # Sort by most recent interaction
-        recent_convos.sort(
-            key=lambda x: x['last_interaction'] or datetime.min, 
-            reverse=True
-        )
-        
-        return recent_convos[:limit]
+
+    @staticmethod
+    def _last_interaction(conversation: Dict) -> Optional[datetime]:
+        if not conversation['messages']:
+            return None
+        return datetime.utcfromtimestamp(conversation['messages'][-1].timestamp)
 
     def _prune_conversations(self):
         """
-        Remove conversations older than max_age
+        Remove conversations older than max_age, then the least recently active
+        ones beyond max_conversations
+
+        Conversations are kept in interaction order, so only expired entries at
+        the front are visited (amortized O(1) per add).
         """
-        current_time = datetime.utcnow()
-        
-        # Identify conversations to remove
-        conversations_to_remove = [
-            conv_id for conv_id, last_interaction in self._last_interactions.items()
-            if current_time - last_interaction > self._max_age
-        ]
-        
-        # Remove old conversations
-        for conv_id in conversations_to_remove:
-            del self._conversations[conv_id]
-            del self._last_interactions[conv_id]
+        cutoff = time.monotonic() - self._max_age
+        while self._conversations:
+            conv_id = next(iter(self._conversations))
+            if self._last_interactions[conv_id] > cutoff:
+                break
+            self._remove(conv_id)
+
+        while len(self._conversations) > self._max_conversations:
+            self._remove(next(iter(self._conversations)))
+
+    def _remove(self, conversation_id: str):
+        conversation = self._conversations.pop(conversation_id)
+        del self._last_interactions[conversation_id]
+        server_ids = self._by_server[conversation['server_id']]
+        del server_ids[conversation_id]
+        if not server_ids:
+            del self._by_server[conversation['server_id']]
+
+    def get_stats(self) -> Dict[str, Any]:
+        l1_lookups = self.l1_hits + self.l1_misses
+        l2_lookups = self.l2_hits + self.l2_misses
+        return {
+            'l1_conversations': len(self._conversations),
+            'l1_hits': self.l1_hits,
+            'l1_misses': self.l1_misses,
+            'l1_hit_rate': self.l1_hits / l1_lookups if l1_lookups else 0.0,
+            'l2_hits': self.l2_hits,
+            'l2_misses': self.l2_misses,
+            'l2_errors': self.l2_errors,
+            'l2_hit_rate': self.l2_hits / l2_lookups if l2_lookups else 0.0
+        }
 
     async def clear_conversation(self, conversation_id: str):
         """
         Clear a specific conversation
         """
         if conversation_id in self._conversations:
-            del self._conversations[conversation_id]
-            del self._last_interactions[conversation_id]
+            self._remove(conversation_id)
+        if self.l2 is not None:
+            self.l2.clear_conversation(conversation_id)
@@ -1,41 +1,708 @@
-from collections import deque
-from dataclasses import dataclass
-from typing import Dict
-from datetime import datetime
+import asyncio
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import TYPE_CHECKING, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+if TYPE_CHECKING:
+    from app.services.conversation_persister import ConversationPersister
+
+# (previous summary, oldest turns) -> new running summary
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token plus per-message overhead)"""
+    return len(text) // 4 + 4
+
+# Shorter contents do not shrink under zlib
+COMPRESS_MIN_BYTES = 128
 
-@dataclass
 class Message:
-    content: str
-    timestamp: datetime
-    is_bot: bool
+    """
+    One stored turn
+
+    Slotted to avoid a per-instance ``__dict__``; the timestamp is a
+    ``time.monotonic()`` float. Token and byte counts are cached on insert so
+    context retrieval never re-measures old messages. ``_data`` holds the
+    content as ``str``, or as zlib-compressed UTF-8 while the channel is idle.
+    """
+    __slots__ = ('_data', 'timestamp', 'is_bot', 'tokens', 'size')
+
+    def __init__(self, content: str, timestamp: float, is_bot: bool, tokens: int = 0, size: int = 0):
+        self._data: Union[str, bytes] = content
+        self.timestamp = timestamp
+        self.is_bot = is_bot
+        self.tokens = tokens
+        self.size = size
+
+    @property
+    def content(self) -> str:
+        if isinstance(self._data, bytes):
+            return zlib.decompress(self._data).decode('utf-8')
+        return self._data
+
+    @property
+    def role(self) -> str:
+        return "assistant" if self.is_bot else "user"
+
+    def compress(self):
+        if isinstance(self._data, str) and self.size >= COMPRESS_MIN_BYTES:
+            self._data = zlib.compress(self._data.encode('utf-8'))
+
+    def decompress(self):
+        if isinstance(self._data, bytes):
+            self._data = self.content
+
+class ChannelHistory:
+    def __init__(self, max_messages: int, max_tokens: int, max_bytes: int):
+        """
+        Rolling message window of one channel with running token/byte totals
+
+        Oldest messages are dropped once any of the caps is exceeded; they are
+        kept in ``overflow`` (up to ``max_messages`` of them) until they have
+        been folded into the channel summary.
+        """
+        self.messages: Deque[Message] = deque()
+        self.overflow: Deque[Message] = deque(maxlen=max_messages)
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.total_tokens = 0
+        self.total_bytes = 0
+        self.last_access = time.monotonic()
+        self.compressed = False
+        # Messages ever dropped from the front; the oldest resident message's position
+        self.dropped = 0
+
+    def append(self, message: Message):
+        self.messages.append(message)
+        self.total_tokens += message.tokens
+        self.total_bytes += message.size
+
+        while self.messages and (
+            len(self.messages) > self.max_messages
+            or self.total_tokens > self.max_tokens
+            or self.total_bytes > self.max_bytes
+        ):
+            self.overflow.append(self.popleft())
+
+    def popleft(self) -> Message:
+        message = self.messages.popleft()
+        self.dropped += 1
+        self.total_tokens -= message.tokens
+        self.total_bytes -= message.size
+        return message
+
+    def compress(self):
+        for message in self.messages:
+            message.compress()
+        self.compressed = True
+
+    def decompress(self):
+        for message in self.messages:
+            message.decompress()
+        self.compressed = False
+
+    def newest(self, count: Optional[int] = None):
+        """Iterate newest-first over at most ``count`` messages without copying"""
+        return islice(reversed(self.messages), count)
+
+    def __len__(self) -> int:
+        return len(self.messages)
 
 class ConversationManager:
-    def __init__(self, max_messages: int = 50):
+    def __init__(
+        self,
+        max_messages: int = 50,
+        context_token_budget: int = 2000,
+        max_channel_tokens: int = 20000,
+        max_channel_bytes: int = 256 * 1024,
+        summarizer: Optional[Summarizer] = None,
+        summary_threshold_tokens: int = 4000,
+        summary_keep_tokens: int = 2000,
+        max_channels: int = 5000,
+        max_total_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 6 * 3600,
+        spill_dir: Optional[str] = None,
+        compress_after: float = 600,
+        persister: Optional["ConversationPersister"] = None,
+        context_chunk: int = 8
+    ):
+        """
+        :param context_chunk: ``get_messages`` moves the start of the context
+            window forward this many messages at a time, so the request prefix
+            stays byte-identical (and prompt-cacheable) between moves
+        :param max_channels: Channels kept in memory before the least recently used is evicted
+        :param max_total_bytes: Stored bytes across all channels before eviction kicks in
+        :param idle_ttl: Seconds without activity after which a channel is evicted (0 disables)
+        :param spill_dir: Directory evicted channels are written to and reloaded from on
+            their next message; evicted history is dropped without one
+        :param compress_after: Seconds without activity after which a resident channel's
+            messages are zlib-compressed until it is used again (0 disables)
+        :param persister: Write-behind store every new turn and summary is handed to;
+            channels that are neither resident nor spilled are reloaded from it by
+            ``ensure_loaded``
+        :param summarizer: Coroutine that folds old turns into a running summary;
+            compaction is disabled without one
+        :param summary_threshold_tokens: Stored tokens in a channel that trigger compaction;
+            reaching three quarters of the message or byte cap, or dropping
+            messages at a cap, triggers it too
+        :param summary_keep_tokens: Recent tokens left verbatim after compaction, which
+            also keeps at most half the message and byte caps
+        """
         self.max_messages = max_messages
-        self.conversations: Dict[int, deque] = {}
-    
-    def add_message(self, channel_id: int, content: str, is_bot: bool = False):
-        if channel_id not in self.conversations:
-            self.conversations[channel_id] = deque(maxlen=self.max_messages)
-        
-        self.conversations[channel_id].append(
-            Message(content=content, timestamp=datetime.now(), is_bot=is_bot)
+        self.context_token_budget = context_token_budget
+        self.context_chunk = max(1, context_chunk)
+        self.max_channel_tokens = max_channel_tokens
+        self.max_channel_bytes = max_channel_bytes
+        # Least recently used first
+        self.conversations: "OrderedDict[int, ChannelHistory]" = OrderedDict()
+        self.max_channels = max_channels
+        self.max_total_bytes = max_total_bytes
+        self.idle_ttl = idle_ttl
+        self.resident_bytes = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+        self.rehydrations = 0
+        self.compress_after = compress_after
+        self.compressed_channels = 0
+        self._next_compress_sweep = 0.0
+
+        self.spill_dir = spill_dir
+        self._spilled: Set[int] = set()
+        # Spill snapshots whose file is still being written
+        self._spilling: Dict[int, Dict] = {}
+        self._spill_writes: Set[asyncio.Future] = set()
+        self._spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-spill")
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            for name in os.listdir(spill_dir):
+                stem, ext = os.path.splitext(name)
+                if ext == ".json" and stem.isdigit():
+                    self._spilled.add(int(stem))
+
+        self.persister = persister
+        self._loading: Dict[int, asyncio.Task] = {}
+        # Messages keep monotonic time; stored turns and summaries use
+        # wall-clock time converted with one fixed offset so they line up exactly
+        self._wall_offset = time.time() - time.monotonic()
+        self.db_loads = 0
+
+        self.summarizer = summarizer
+        self.summary_threshold_tokens = summary_threshold_tokens
+        self.summary_keep_tokens = summary_keep_tokens
+        self.summaries: Dict[int, str] = {}
+        self._compacting: Set[int] = set()
+        self._compaction_tasks: Set[asyncio.Task] = set()
+        self.compactions = 0
+        self.compaction_failures = 0
+
+    def _new_history(self) -> ChannelHistory:
+        return ChannelHistory(self.max_messages, self.max_channel_tokens, self.max_channel_bytes)
+
+    def _get_history(self, channel_id: int, create: bool = False) -> Optional[ChannelHistory]:
+        """
+        Resident history of a channel, reloaded from the spill directory if it was evicted
+
+        Marks the channel as most recently used.
+        """
+        history = self.conversations.get(channel_id)
+        if history is None:
+            history = self._rehydrate(channel_id)
+            if history is None:
+                if not create:
+                    return None
+                history = self._new_history()
+            self._insert(channel_id, history)
+        else:
+            history.last_access = time.monotonic()
+            self.conversations.move_to_end(channel_id)
+            if history.compressed:
+                history.decompress()
+                self.compressed_channels -= 1
+        return history
+
+    def _insert(self, channel_id: int, history: ChannelHistory):
+        history.last_access = time.monotonic()
+        self.conversations[channel_id] = history
+        self.resident_bytes += history.total_bytes
+        self._enforce_limits()
+
+    def _history_from_turns(self, turns: Iterable[Tuple[str, bool, float]]) -> ChannelHistory:
+        """Rebuild a history from (content, is_bot, epoch timestamp) turns"""
+        history = self._new_history()
+        for content, is_bot, timestamp in turns:
+            history.append(self._make_message(content, is_bot, timestamp - self._wall_offset))
+        return history
+
+    async def ensure_loaded(self, channel_id: int):
+        """
+        Bring a channel's history into memory before it is used
+
+        Spilled channels are read back from disk and channels that are neither
+        resident nor spilled are reloaded from the persister. The file or
+        database work runs off the event loop; concurrent callers share the
+        same load.
+        """
+        if channel_id in self.conversations:
+            return
+        if channel_id not in self._spilled and self.persister is None:
+            return
+        task = self._loading.get(channel_id)
+        if task is None:
+            task = asyncio.create_task(self._load(channel_id))
+            self._loading[channel_id] = task
+        await asyncio.shield(task)
+
+    async def _load(self, channel_id: int):
+        try:
+            if channel_id in self._spilled:
+                history = await self._rehydrate_async(channel_id)
+                if history is not None and channel_id not in self.conversations:
+                    self._insert(channel_id, history)
+                return
+            if self.persister is None:
+                return
+            turns = await self.persister.load_channel(channel_id, self.max_messages)
+            stored = await self.persister.load_summary(channel_id)
+            # A message may have arrived while the queries ran
+            if channel_id in self.conversations:
+                return
+            if stored is not None:
+                # Turns folded into the summary stay in the table but are not reloaded
+                summary, through = stored
+                turns = [turn for turn in turns if round(turn[2], 6) > through]
+                self.summaries[channel_id] = summary
+            if turns or stored is not None:
+                self._insert(channel_id, self._history_from_turns(turns))
+                self.db_loads += 1
+        except Exception as e:
+            print(f"Error loading conversation {channel_id}: {e}")
+        finally:
+            self._loading.pop(channel_id, None)
+
+    def _spill_path(self, channel_id: int) -> str:
+        return os.path.join(self.spill_dir, f"{channel_id}.json")
+
+    @staticmethod
+    def _write_spill_file(path: str, data: Dict):
+        """Serialize a spill snapshot; runs on the spill I/O thread"""
+        data = {
+            'summary': data['summary'],
+            'messages': [
+                [zlib.decompress(content).decode('utf-8') if isinstance(content, bytes) else content, is_bot, timestamp]
+                for content, is_bot, timestamp in data['messages']
+            ]
+        }
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    def _read_spill_file(path: str) -> Dict:
+        """Load and delete a spill file; runs on the spill I/O thread"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        os.remove(path)
+        return data
+
+    @staticmethod
+    def _remove_spill_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _run_spill_io(self, func: Callable, *args) -> Optional[asyncio.Future]:
+        """
+        Run spill file work on the single I/O thread, so writes, reads and
+        deletes of a channel happen in the order they were issued
+
+        Runs inline when there is no event loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            func(*args)
+            return None
+        return loop.run_in_executor(self._spill_executor, func, *args)
+
+    def _spill(self, channel_id: int, history: ChannelHistory, summary: Optional[str]):
+        # Monotonic timestamps are meaningless across restarts, store wall-clock time.
+        # Contents are snapshotted as stored (possibly compressed) and decoded on
+        # the I/O thread.
+        data = {
+            'summary': summary,
+            'messages': [
+                (msg._data, msg.is_bot, msg.timestamp + self._wall_offset)
+                for msg in history.messages
+            ]
+        }
+        self._spilled.add(channel_id)
+        # Readable from memory until the file is written
+        self._spilling[channel_id] = data
+        path = self._spill_path(channel_id)
+        try:
+            future = self._run_spill_io(self._write_spill_file, path, data)
+        except OSError as e:
+            self._spill_failed(channel_id, data, e)
+            return
+        if future is None:
+            self._spill_written(channel_id, data)
+            return
+
+        def done(future: asyncio.Future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._spill_failed(channel_id, data, future.exception())
+            else:
+                self._spill_written(channel_id, data)
+
+        future.add_done_callback(done)
+        self._spill_writes.add(future)
+        future.add_done_callback(self._spill_writes.discard)
+
+    def _spill_written(self, channel_id: int, data: Dict):
+        if self._spilling.get(channel_id) is data:
+            del self._spilling[channel_id]
+        elif channel_id not in self._spilled:
+            # Reloaded or cleared while the write was running
+            self._run_spill_io(self._remove_spill_file, self._spill_path(channel_id))
+
+    def _spill_failed(self, channel_id: int, data: Dict, error: BaseException):
+        print(f"Error spilling conversation {channel_id}: {error}")
+        if self._spilling.get(channel_id) is data:
+            del self._spilling[channel_id]
+            self._spilled.discard(channel_id)
+
+    def _history_from_spill(self, channel_id: int, data: Dict) -> ChannelHistory:
+        history = self._history_from_turns(
+            (zlib.decompress(content).decode('utf-8') if isinstance(content, bytes) else content, is_bot, timestamp)
+            for content, is_bot, timestamp in data.get('messages', [])
+        )
+        if data.get('summary'):
+            self.summaries[channel_id] = data['summary']
+        self.rehydrations += 1
+        return history
+
+    async def _rehydrate_async(self, channel_id: int) -> Optional[ChannelHistory]:
+        self._spilled.discard(channel_id)
+        data = self._spilling.pop(channel_id, None)
+        if data is None:
+            try:
+                data = await self._run_spill_io(self._read_spill_file, self._spill_path(channel_id))
+            except (OSError, ValueError) as e:
+                print(f"Error loading spilled conversation {channel_id}: {e}")
+                return None
+        return self._history_from_spill(channel_id, data)
+
+    def _rehydrate(self, channel_id: int) -> Optional[ChannelHistory]:
+        """
+        Synchronous fallback for callers that skipped ``ensure_loaded``
+
+        Blocks the event loop on the file read, so request paths await
+        ``ensure_loaded`` first.
+        """
+        if channel_id not in self._spilled:
+            return None
+        self._spilled.discard(channel_id)
+        data = self._spilling.pop(channel_id, None)
+        if data is None:
+            try:
+                data = self._read_spill_file(self._spill_path(channel_id))
+            except (OSError, ValueError) as e:
+                print(f"Error loading spilled conversation {channel_id}: {e}")
+                return None
+        return self._history_from_spill(channel_id, data)
+
+    async def close(self):
+        """Wait for spill files still being written"""
+        if self._spill_writes:
+            await asyncio.gather(*self._spill_writes, return_exceptions=True)
+        self._spill_executor.shutdown(wait=True)
+
+    def _evict(self, channel_id: int):
+        history = self.conversations.pop(channel_id)
+        self.resident_bytes -= history.total_bytes
+        if history.compressed:
+            self.compressed_channels -= 1
+        summary = self.summaries.pop(channel_id, None)
+        if self.spill_dir and (history.messages or summary):
+            self._spill(channel_id, history, summary)
+        self.evictions += 1
+
+    def _enforce_limits(self):
+        """Evict idle channels, then least recently used ones until within the global caps"""
+        if self.idle_ttl:
+            cutoff = time.monotonic() - self.idle_ttl
+            while self.conversations:
+                channel_id, history = next(iter(self.conversations.items()))
+                if history.last_access > cutoff:
+                    break
+                self._evict(channel_id)
+                self.idle_evictions += 1
+
+        # The most recently used channel always stays resident
+        while len(self.conversations) > 1 and (
+            len(self.conversations) > self.max_channels
+            or self.resident_bytes > self.max_total_bytes
+        ):
+            self._evict(next(iter(self.conversations)))
+
+        self._compress_idle()
+
+    def _compress_idle(self):
+        """Compress channels idle for ``compress_after``, at most every few seconds"""
+        now = time.monotonic()
+        if not self.compress_after or now < self._next_compress_sweep:
+            return
+        self._next_compress_sweep = now + min(10.0, self.compress_after / 2)
+
+        cutoff = now - self.compress_after
+        for history in self.conversations.values():
+            if history.last_access > cutoff:
+                break
+            if not history.compressed:
+                history.compress()
+                self.compressed_channels += 1
+
+    def _make_message(self, content: str, is_bot: bool, timestamp: float) -> Message:
+        return Message(
+            content,
+            timestamp,
+            is_bot,
+            tokens=estimate_tokens(content),
+            size=len(content.encode('utf-8'))
         )
-    
+
+    def add_message(
+        self,
+        channel_id: int,
+        content: str,
+        is_bot: bool = False,
+        server_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ):
+        """
+        :param user_id: Author of a user turn, recorded with the persisted turn
+        """
+        history = self._get_history(channel_id, create=True)
+
+        # A single oversized message must not evict the whole channel
+        encoded = content.encode('utf-8')
+        if len(encoded) > self.max_channel_bytes // 2:
+            content = encoded[:self.max_channel_bytes // 2].decode('utf-8', errors='ignore')
+
+        stored_bytes = history.total_bytes
+        now = time.monotonic()
+        history.append(self._make_message(content, is_bot, now))
+        self.resident_bytes += history.total_bytes - stored_bytes
+        if self.persister is not None:
+            self.persister.enqueue(
+                channel_id,
+                content,
+                is_bot,
+                server_id=server_id,
+                timestamp=now + self._wall_offset,
+                user_id=user_id
+            )
+        self._maybe_compact(channel_id)
+        self._enforce_limits()
+
+    def _maybe_compact(self, channel_id: int):
+        """Schedule background summarization once a channel grows past the threshold"""
+        history = self.conversations[channel_id]
+        if self.summarizer is None:
+            history.overflow.clear()
+            return
+        if channel_id in self._compacting or not (
+            history.overflow
+            or history.total_tokens > self.summary_threshold_tokens
+            or len(history) >= self.max_messages * 3 // 4
+            or history.total_bytes >= self.max_channel_bytes * 3 // 4
+        ):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self._compacting.add(channel_id)
+        task = loop.create_task(self._compact(channel_id, history))
+        self._compaction_tasks.add(task)
+        task.add_done_callback(self._compaction_tasks.discard)
+
+    async def _compact(self, channel_id: int, history: ChannelHistory):
+        """
+        Fold the oldest turns into the channel summary, off the request path
+        """
+        try:
+            # Messages already dropped at a cap come first, then the oldest resident ones
+            dropped = list(history.overflow)
+            oldest: List[Message] = []
+            remaining_tokens = history.total_tokens
+            remaining_bytes = history.total_bytes
+            remaining_messages = len(history)
+            for msg in history.messages:
+                if (
+                    remaining_tokens <= self.summary_keep_tokens
+                    and remaining_messages <= self.max_messages // 2
+                    and remaining_bytes <= self.max_channel_bytes // 2
+                ):
+                    break
+                oldest.append(msg)
+                remaining_tokens -= msg.tokens
+                remaining_bytes -= msg.size
+                remaining_messages -= 1
+            if not dropped and not oldest:
+                return
+
+            turns = [
+                {"role": msg.role, "content": msg.content}
+                for msg in dropped + oldest
+            ]
+            summary = await self.summarizer(self.summaries.get(channel_id, ""), turns)
+
+            # The channel may have been cleared or trimmed while we waited
+            if self.conversations.get(channel_id) is not history:
+                return
+            for msg in oldest:
+                if history.messages and history.messages[0] is msg:
+                    self.resident_bytes -= history.popleft().size
+            # Anything the caps dropped meanwhile is left for the next compaction
+            summarized = {id(msg) for msg in dropped + oldest}
+            pending = [msg for msg in history.overflow if id(msg) not in summarized]
+            history.overflow.clear()
+            history.overflow.extend(pending)
+            if summary:
+                self.summaries[channel_id] = summary
+                if self.persister is not None:
+                    # Stored turns up to the newest summarized one are skipped on reload
+                    through = round((dropped + oldest)[-1].timestamp + self._wall_offset, 6)
+                    self.persister.set_summary(channel_id, summary, through)
+            self.compactions += 1
+        except Exception as e:
+            self.compaction_failures += 1
+            print(f"Error compacting conversation {channel_id}: {e}")
+        finally:
+            self._compacting.discard(channel_id)
+
     def get_context(self, channel_id: int, last_n: int = 5) -> str:
-        if channel_id not in self.conversations:
+        history = self._get_history(channel_id)
+        if history is None:
             return ""
-            
-        recent_messages = list(self.conversations[channel_id])[-last_n:]
-        context = []
-        
-        for msg in recent_messages:
-            prefix = "Assistant" if msg.is_bot else "User"
-            context.append(f"{prefix}: {msg.content}")
-            
-        return "\n".join(context)
+
+        recent = [
+            f"{'Assistant' if msg.is_bot else 'User'}: {msg.content}"
+            for msg in history.newest(last_n)
+        ]
+        summary = self.summaries.get(channel_id)
+        if summary:
+            recent.append(f"Summary of earlier conversation: {summary}")
+        recent.reverse()
+        return "\n".join(recent)
+
+    def get_messages(self, channel_id: int, max_tokens: int = None) -> List[Dict[str, str]]:
+        """
+        Build alternating user/assistant turns for the Messages API
+
+        Turns are packed newest-first until ``max_tokens`` (defaults to the
+        manager's context budget) would be exceeded. Consecutive turns from the
+        same side are merged and the result always starts with a user turn.
+
+        The oldest included message is rounded forward to a multiple of
+        ``context_chunk`` (counted over the channel's lifetime), so as the
+        window slides the prefix only changes once every ``context_chunk``
+        messages instead of on every turn; up to ``context_chunk - 1`` messages
+        that would fit are left out for that. Fewer than ``context_chunk``
+        packed messages, or an aligned window without a user turn, are sent
+        unaligned so a turn never goes out without the context that fits.
+        """
+        history = self._get_history(channel_id)
+        if history is None:
+            return []
+
+        budget = self.context_token_budget if max_tokens is None else max_tokens
+        packed: List[Message] = []
+        used = 0
+
+        summary = self.summaries.get(channel_id)
+        if summary:
+            summary = f"[Summary of earlier conversation]\n{summary}"
+            # An oversized summary is cut to half the budget, leaving room for recent turns
+            max_summary_chars = max(0, (budget // 2 - 4) * 4)
+            if estimate_tokens(summary) > budget // 2:
+                summary = summary[:max_summary_chars]
+            used += estimate_tokens(summary)
+
+        for msg in history.newest():
+            if used + msg.tokens > budget:
+                break
+            packed.append(msg)
+            used += msg.tokens
+
+        packed.reverse()
+        if len(packed) >= self.context_chunk:
+            # Position of the oldest packed message over the channel's lifetime
+            first = history.dropped + len(history) - len(packed)
+            aligned = -(-first // self.context_chunk) * self.context_chunk
+            window = packed[aligned - first:]
+            if any(msg.role == "user" for msg in window):
+                packed = window
+
+        messages: List[Dict[str, str]] = []
+        # The running summary stands in for the turns it replaced
+        if summary:
+            messages.append({"role": "user", "content": summary})
+        for msg in packed:
+            if messages and messages[-1]["role"] == msg.role:
+                messages[-1]["content"] += f"\n\n{msg.content}"
+            else:
+                messages.append({"role": msg.role, "content": msg.content})
+
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+
+        return messages
+
+    def get_channel_usage(self, channel_id: int) -> Dict[str, int]:
+        """Stored message count, estimated tokens and bytes of a channel"""
+        history = self.conversations.get(channel_id)
+        if history is None:
+            return {'messages': 0, 'tokens': 0, 'bytes': 0}
+        return {'messages': len(history), 'tokens': history.total_tokens, 'bytes': history.total_bytes}
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'resident_channels': len(self.conversations),
+            'resident_bytes': self.resident_bytes,
+            'spilled_channels': len(self._spilled),
+            'evictions': self.evictions,
+            'idle_evictions': self.idle_evictions,
+            'rehydrations': self.rehydrations,
+            'db_loads': self.db_loads,
+            'compressed_channels': self.compressed_channels,
+            'compactions': self.compactions,
+            'compaction_failures': self.compaction_failures
+        }
 
     def clear_context(self, channel_id: int):
         """Clear conversation context for a specific channel"""
         if channel_id in self.conversations:
-            del self.conversations[channel_id]
+            history = self.conversations.pop(channel_id)
+            self.resident_bytes -= history.total_bytes
+            if history.compressed:
+                self.compressed_channels -= 1
+        self.summaries.pop(channel_id, None)
+        if self.persister is not None:
+            self.persister.clear(channel_id)
+        if channel_id in self._spilled:
+            self._spilled.discard(channel_id)
+            # A write still in flight removes its own file once it sees the channel is gone
+            if self._spilling.pop(channel_id, None) is None:
+                self._run_spill_io(self._remove_spill_file, self._spill_path(channel_id))
@@ -0,0 +1,398 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Conversation, ConversationMessage
+
+# (content, is_bot, epoch timestamp)
+StoredTurn = Tuple[str, bool, float]
+
+@dataclass
+class PendingTurn:
+    conversation_id: str
+    channel_id: Optional[int]
+    server_id: Optional[str]
+    user_id: Optional[str]
+    role: str
+    content: str
+    timestamp: float
+
+def channel_conversation_id(channel_id: int) -> str:
+    return f"channel-{channel_id}"
+
+class ConversationPersister:
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        flush_interval: float = 2.0,
+        batch_size: int = 200,
+        max_pending: int = 10000
+    ):
+        """
+        Write-behind persistence of conversation turns
+
+        ``enqueue`` only appends to an in-memory buffer; a background task
+        writes the buffer in one transaction every ``flush_interval`` seconds or
+        as soon as ``batch_size`` turns are waiting. Failed batches are retried
+        on the next flush.
+
+        Turns are bulk-inserted into the append-only ``conversation_messages``
+        table with a per-conversation ``seq``; existing rows are never rewritten.
+        A channel's running summary is kept in its ``conversations.context``.
+
+        :param session_factory: Callable returning an ``AsyncSession``
+        :param flush_interval: Seconds between flushes
+        :param batch_size: Pending turns that trigger an early flush
+        :param max_pending: Turns buffered while the database is unreachable;
+            the oldest are dropped beyond this
+        """
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        self._pending: Deque[PendingTurn] = deque()
+        # Conversation ids whose stored turns are deleted at the next flush
+        self._cleared: Set[str] = set()
+        # Latest (summary, epoch time of the newest turn it covers) per conversation_id
+        self._summaries: Dict[str, Tuple[str, float]] = {}
+        # Next seq per conversation_id, filled from the table on first write
+        self._next_seq: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.flushed = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.dropped = 0
+        self.last_flush_seconds = 0.0
+
+    def enqueue(
+        self,
+        channel_id: int,
+        content: str,
+        is_bot: bool,
+        server_id: Optional[str] = None,
+        timestamp: Optional[float] = None,
+        user_id: Optional[str] = None
+    ):
+        """Buffer a channel turn for the next flush; never blocks"""
+        self.enqueue_turn(
+            channel_conversation_id(channel_id),
+            'assistant' if is_bot else 'user',
+            content,
+            channel_id=channel_id,
+            server_id=server_id,
+            user_id=user_id,
+            timestamp=timestamp
+        )
+
+    def enqueue_turn(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        channel_id: Optional[int] = None,
+        server_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        timestamp: Optional[float] = None
+    ):
+        """Buffer a turn of any conversation for the next flush; never blocks"""
+        self._pending.append(PendingTurn(
+            conversation_id=conversation_id,
+            channel_id=channel_id,
+            server_id=server_id,
+            user_id=user_id,
+            role=role,
+            content=content,
+            timestamp=time.time() if timestamp is None else timestamp
+        ))
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def set_summary(self, channel_id: int, summary: str, through: float):
+        """
+        Store a channel's running summary at the next flush, replacing the last one
+
+        :param through: Epoch timestamp of the newest turn the summary covers
+        """
+        self._summaries[channel_conversation_id(channel_id)] = (summary, through)
+
+    def clear(self, channel_id: int):
+        """Forget a channel's stored history at the next flush"""
+        self.clear_conversation(channel_conversation_id(channel_id))
+
+    def clear_conversation(self, conversation_id: str):
+        self._pending = deque(turn for turn in self._pending if turn.conversation_id != conversation_id)
+        self._summaries.pop(conversation_id, None)
+        self._cleared.add(conversation_id)
+        self._wakeup.set()
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every buffered turn in a single transaction"""
+        async with self._flush_lock:
+            if not self._pending and not self._cleared and not self._summaries:
+                return
+            batch = list(self._pending)
+            self._pending.clear()
+            cleared = set(self._cleared)
+            self._cleared.clear()
+            summaries = dict(self._summaries)
+            self._summaries.clear()
+
+            started = time.perf_counter()
+            try:
+                async with self.session_factory() as session:
+                    async with session.begin():
+                        await self._write(session, batch, cleared, summaries)
+            except Exception as e:
+                self.flush_failures += 1
+                print(f"Error persisting conversations: {e}")
+                # Keep the batch (ahead of newer turns) for the next attempt;
+                # seqs are re-read since the transaction was rolled back.
+                # Conversations cleared while the write ran must stay cleared.
+                self._next_seq.clear()
+                self._pending.extendleft(
+                    turn for turn in reversed(batch) if turn.conversation_id not in self._cleared
+                )
+                self._cleared |= cleared
+                # A newer summary set meanwhile replaces the failed one
+                for conversation_id, summary in summaries.items():
+                    if conversation_id not in self._cleared:
+                        self._summaries.setdefault(conversation_id, summary)
+                while len(self._pending) > self.max_pending:
+                    self._pending.popleft()
+                    self.dropped += 1
+                return
+
+            self.flushes += 1
+            self.flushed += len(batch)
+            self.last_flush_seconds = time.perf_counter() - started
+
+    async def _write(
+        self,
+        session: AsyncSession,
+        batch: List[PendingTurn],
+        cleared: Set[str],
+        summaries: Dict[str, Tuple[str, float]]
+    ):
+        if cleared:
+            cleared_ids = list(cleared)
+            await session.execute(
+                delete(ConversationMessage).where(ConversationMessage.conversation_id.in_(cleared_ids))
+            )
+            await session.execute(delete(Conversation).where(Conversation.conversation_id.in_(cleared_ids)))
+            for conversation_id in cleared_ids:
+                self._next_seq.pop(conversation_id, None)
+
+        # First turn of each conversation in the batch carries its metadata
+        first_turns: Dict[str, PendingTurn] = {}
+        for turn in batch:
+            first_turns.setdefault(turn.conversation_id, turn)
+        if first_turns:
+            await self._write_turns(session, batch, first_turns)
+
+        # Turns always precede their summary, so the conversation row exists
+        for conversation_id, (summary, through) in summaries.items():
+            await session.execute(
+                update(Conversation)
+                .where(Conversation.conversation_id == conversation_id)
+                .values(context={'summary': summary, 'summary_through': through})
+            )
+
+    async def _write_turns(self, session: AsyncSession, batch: List[PendingTurn], first_turns: Dict[str, PendingTurn]):
+
+        unknown = [conversation_id for conversation_id in first_turns if conversation_id not in self._next_seq]
+        if unknown:
+            result = await session.execute(
+                select(Conversation.conversation_id, func.max(ConversationMessage.seq))
+                .outerjoin(ConversationMessage, ConversationMessage.conversation_id == Conversation.conversation_id)
+                .where(Conversation.conversation_id.in_(unknown))
+                .group_by(Conversation.conversation_id)
+            )
+            existing = {conversation_id: max_seq for conversation_id, max_seq in result}
+            new_conversations = []
+            for conversation_id in unknown:
+                if conversation_id in existing:
+                    self._next_seq[conversation_id] = (existing[conversation_id] or 0) + 1
+                else:
+                    self._next_seq[conversation_id] = 1
+                    turn = first_turns[conversation_id]
+                    new_conversations.append({
+                        'conversation_id': conversation_id,
+                        'channel_id': None if turn.channel_id is None else str(turn.channel_id),
+                        'server_id': turn.server_id,
+                        'user_id': turn.user_id,
+                        'context': {}
+                    })
+            if new_conversations:
+                await session.execute(insert(Conversation), new_conversations)
+
+        rows = []
+        for turn in batch:
+            seq = self._next_seq[turn.conversation_id]
+            self._next_seq[turn.conversation_id] = seq + 1
+            rows.append({
+                'conversation_id': turn.conversation_id,
+                'seq': seq,
+                'channel_id': None if turn.channel_id is None else str(turn.channel_id),
+                'server_id': turn.server_id,
+                'user_id': turn.user_id,
+                'role': turn.role,
+                'content': turn.content,
+                'created_at': datetime.utcfromtimestamp(turn.timestamp)
+            })
+        await session.execute(insert(ConversationMessage), rows)
+        await session.execute(
+            update(Conversation)
+            .where(Conversation.conversation_id.in_(list(first_turns)))
+            .values(updated_at=datetime.utcnow())
+        )
+
+    async def load_channel(self, channel_id: int, limit: int) -> List[StoredTurn]:
+        """
+        Most recent ``limit`` turns of a channel, oldest first, including turns
+        not flushed yet
+        """
+        stored: List[StoredTurn] = []
+        if channel_conversation_id(channel_id) not in self._cleared:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(ConversationMessage.content, ConversationMessage.role, ConversationMessage.created_at)
+                    .where(ConversationMessage.channel_id == str(channel_id))
+                    .order_by(ConversationMessage.created_at.desc(), ConversationMessage.seq.desc())
+                    .limit(limit)
+                )
+                stored = [
+                    (content, role == 'assistant', created_at.replace(tzinfo=timezone.utc).timestamp())
+                    for content, role, created_at in result
+                ]
+            stored.reverse()
+
+        stored.extend(
+            (turn.content, turn.role == 'assistant', turn.timestamp)
+            for turn in self._pending if turn.channel_id == channel_id
+        )
+        return stored[-limit:]
+
+    async def load_summary(self, channel_id: int) -> Optional[Tuple[str, float]]:
+        """
+        A channel's running summary and the epoch time of the newest turn it
+        covers, including one not flushed yet; None if it has none
+        """
+        conversation_id = channel_conversation_id(channel_id)
+        if conversation_id in self._summaries:
+            return self._summaries[conversation_id]
+        if conversation_id in self._cleared:
+            return None
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Conversation.context).where(Conversation.conversation_id == conversation_id)
+            )
+            context = result.scalar()
+        if not context or not context.get('summary'):
+            return None
+        return context['summary'], context['summary_through']
+
+    async def load_conversation(self, conversation_id: str, limit: int) -> Optional[Dict]:
+        """
+        Metadata and the most recent ``limit`` turns of a conversation, including
+        turns not flushed yet; None if it is unknown
+
+        Turns are ``PendingTurn`` objects, oldest first.
+        """
+        pending = [turn for turn in self._pending if turn.conversation_id == conversation_id]
+        conversation = None
+        turns: List[PendingTurn] = []
+        if conversation_id not in self._cleared:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(Conversation.server_id, Conversation.user_id)
+                    .where(Conversation.conversation_id == conversation_id)
+                )
+                conversation = result.first()
+                if conversation is not None:
+                    result = await session.execute(
+                        select(ConversationMessage)
+                        .where(ConversationMessage.conversation_id == conversation_id)
+                        .order_by(ConversationMessage.seq.desc())
+                        .limit(limit)
+                    )
+                    turns = [
+                        PendingTurn(
+                            conversation_id=conversation_id,
+                            channel_id=None,
+                            server_id=row.server_id,
+                            user_id=row.user_id,
+                            role=row.role,
+                            content=row.content,
+                            timestamp=row.created_at.replace(tzinfo=timezone.utc).timestamp()
+                        )
+                        for row in result.scalars()
+                    ]
+                    turns.reverse()
+
+        if conversation is None and not pending:
+            return None
+        metadata = conversation or pending[0]
+        return {
+            'conversation_id': conversation_id,
+            'server_id': metadata.server_id,
+            'user_id': metadata.user_id,
+            'turns': (turns + pending)[-limit:]
+        }
+
+    async def recent_conversation_ids(self, server_id: str, limit: int) -> List[str]:
+        """Ids of a server's most recently updated stored conversations"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Conversation.conversation_id)
+                .where(Conversation.server_id == server_id)
+                .order_by(Conversation.updated_at.desc())
+                .limit(limit)
+            )
+            return list(result.scalars())
+
+    async def close(self):
+        """Stop the background task and flush what is left"""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'persist_pending': len(self._pending),
+            'persist_flushed': self.flushed,
+            'persist_flushes': self.flushes,
+            'persist_failures': self.flush_failures,
+            'persist_dropped': self.dropped,
+            'persist_last_flush_seconds': self.last_flush_seconds
+        }
@@ -0,0 +1,110 @@
+import asyncio
+from typing import Dict, Optional
+
+import aiohttp
+
+class HttpClientManager:
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        connect_timeout: float = 10.0,
+        total_timeout: float = 60.0
+    ):
+        """
+        Long-lived aiohttp client with a keep-alive connection pool
+
+        :param limit: Maximum number of open connections overall
+        :param limit_per_host: Maximum number of open connections per host
+        :param keepalive_timeout: Seconds an idle connection is kept open for reuse
+        :param dns_cache_ttl: Seconds resolved addresses are cached
+        :param connect_timeout: Seconds allowed to establish a connection
+        :param total_timeout: Default upper bound for a whole request
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connect_timeout = connect_timeout
+        self.total_timeout = total_timeout
+
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+        self.requests_started = 0
+
+    async def start(self) -> aiohttp.ClientSession:
+        """
+        Create the pooled session (idempotent)
+        """
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                self._connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=self.dns_cache_ttl,
+                    use_dns_cache=True,
+                    enable_cleanup_closed=True
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=self._connector,
+                    timeout=aiohttp.ClientTimeout(
+                        total=self.total_timeout,
+                        connect=self.connect_timeout
+                    )
+                )
+            return self._session
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared session, starting it lazily if needed
+        """
+        if self._session is None or self._session.closed:
+            await self.start()
+        self.requests_started += 1
+        return self._session
+
+    async def close(self):
+        """
+        Close the session and every pooled connection
+        """
+        async with self._lock:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = None
+            self._connector = None
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    def get_stats(self) -> Dict:
+        """
+        Snapshot of connection pool usage
+        """
+        if self._connector is None or self.closed:
+            return {
+                'open_connections': 0,
+                'idle_connections': 0,
+                'in_use_connections': 0,
+                'limit': self.limit,
+                'limit_per_host': self.limit_per_host,
+                'requests_started': self.requests_started
+            }
+
+        # aiohttp does not expose pool counters publicly; these attributes
+        # have been stable across 3.x releases.
+        idle = sum(len(conns) for conns in getattr(self._connector, '_conns', {}).values())
+        in_use = len(getattr(self._connector, '_acquired', ()))
+
+        return {
+            'open_connections': idle + in_use,
+            'idle_connections': idle,
+            'in_use_connections': in_use,
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'requests_started': self.requests_started
+        }
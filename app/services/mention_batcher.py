@@ -0,0 +1,102 @@
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+
+_SECTION = re.compile(r'^\s*\[(\d+)\][ \t]*', re.MULTILINE)
+
+def build_batch_prompt(questions: Sequence[Tuple[str, str]]) -> str:
+    """
+    Merge (author name, question) pairs into one prompt asking for numbered answers
+    """
+    lines = [
+        "Several people asked you something at about the same time. Answer each of them "
+        "separately. Start every answer on its own line with the question's number in "
+        "brackets, like [1], and address the person by name.",
+        ""
+    ]
+    for number, (author, question) in enumerate(questions, start=1):
+        lines.append(f"[{number}] {author}: {question}")
+    return "\n".join(lines)
+
+def split_batch_response(response: str, count: int) -> Optional[List[str]]:
+    """
+    Split a numbered answer back into one answer per question
+
+    :return: ``count`` answers in question order, or None if any is missing
+    """
+    matches = list(_SECTION.finditer(response))
+    answers: Dict[int, str] = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(response)
+        number = int(match.group(1))
+        if 1 <= number <= count and number not in answers:
+            answers[number] = response[match.end():end].strip()
+    if len(answers) != count or not all(answers.values()):
+        return None
+    return [answers[number] for number in range(1, count + 1)]
+
+class MentionBatcher(Generic[T]):
+    def __init__(
+        self,
+        flush: Callable[[List[T]], Awaitable],
+        window: float = 1.0,
+        max_batch: int = 5
+    ):
+        """
+        Collect mentions that arrive in the same channel within ``window`` seconds
+
+        The first mention of a channel opens a batch; ``flush`` is awaited with
+        every mention that joined it once the window closes or ``max_batch``
+        is reached.
+
+        :param flush: Coroutine receiving one channel's batch, oldest first
+        :param window: Seconds a batch stays open after its first mention
+        :param max_batch: Mentions that close a batch early
+        """
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+
+        self._batches: Dict[int, List[T]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+
+        self.mentions = 0
+        self.flushed = 0
+        self.batches = 0
+
+    async def add(self, channel_id: int, item: T):
+        self.mentions += 1
+        batch = self._batches.setdefault(channel_id, [])
+        batch.append(item)
+        if len(batch) >= self.max_batch:
+            timer = self._timers.pop(channel_id, None)
+            if timer is not None:
+                timer.cancel()
+            await self._flush(channel_id)
+        elif channel_id not in self._timers:
+            self._timers[channel_id] = asyncio.create_task(self._flush_later(channel_id))
+
+    async def _flush_later(self, channel_id: int):
+        await asyncio.sleep(self.window)
+        self._timers.pop(channel_id, None)
+        await self._flush(channel_id)
+
+    async def _flush(self, channel_id: int):
+        batch = self._batches.pop(channel_id, None)
+        if not batch:
+            return
+        self.batches += 1
+        self.flushed += len(batch)
+        try:
+            await self.flush(batch)
+        except Exception as e:
+            print(f"Error flushing mention batch for channel {channel_id}: {e}")
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'batch_mentions': self.mentions,
+            'batch_batches': self.batches,
+            'batch_saved_calls': self.flushed - self.batches
+        }
@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from typing import Dict
+
+class MessageDeduplicator:
+    def __init__(self, window: float = 600.0, max_entries: int = 10000):
+        """
+        Remember recently handled message ids so each message is processed once
+
+        Ids are kept in arrival order, so expired entries are always at the
+        front and both the lookup and the pruning are O(1) per message.
+
+        :param window: Seconds an id is remembered
+        :param max_entries: Ids kept at most; the oldest are forgotten first
+        """
+        self.window = window
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+
+        self.checked = 0
+        self.duplicates = 0
+
+    def seen(self, message_id: int) -> bool:
+        """
+        Record ``message_id`` and report whether it was already handled
+
+        :return: True if the id was seen within the window
+        """
+        now = time.monotonic()
+        self._prune(now)
+        self.checked += 1
+        if message_id in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen[message_id] = now
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return False
+
+    def _prune(self, now: float):
+        cutoff = now - self.window
+        while self._seen:
+            message_id, seen_at = next(iter(self._seen.items()))
+            if seen_at > cutoff:
+                break
+            del self._seen[message_id]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'dedupe_tracked': len(self._seen),
+            'dedupe_checked': self.checked,
+            'dedupe_duplicates': self.duplicates
+        }
@@ -0,0 +1,108 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, Mapping, Optional
+
+@dataclass
+class RoutingDecision:
+    model: str
+    max_tokens: int
+    reason: str = "default"
+
+class ModelRouter:
+    def __init__(
+        self,
+        default_model: str = "claude-3-5-haiku-20241022",
+        fast_model: str = "claude-3-5-haiku-20241022",
+        default_max_tokens: int = 1000,
+        degraded_max_tokens: int = 500,
+        long_prompt_tokens: int = 4000,
+        queue_pressure_threshold: int = 20,
+        premium_guilds: Optional[Iterable[str]] = None,
+        queue_depth: Optional[Callable[[], int]] = None
+    ):
+        """
+        Pick a model and ``max_tokens`` for each request
+
+        Precedence: queue pressure (degrade to the fast model), then the role's
+        premium settings for premium guilds, then the role's long-prompt model,
+        then the role's own model/max_tokens, then the defaults.
+
+        :param default_model: Model used when nothing else applies
+        :param fast_model: Model used while queues are deep
+        :param default_max_tokens: Output budget when the role sets none
+        :param degraded_max_tokens: Output cap while queues are deep
+        :param long_prompt_tokens: Estimated prompt size that counts as long
+        :param queue_pressure_threshold: Pending requests that count as deep queues
+        :param premium_guilds: Guild ids on the premium tier
+        :param queue_depth: Callable returning the current number of pending requests
+        """
+        self.default_model = default_model
+        self.fast_model = fast_model
+        self.default_max_tokens = default_max_tokens
+        self.degraded_max_tokens = degraded_max_tokens
+        self.long_prompt_tokens = long_prompt_tokens
+        self.queue_pressure_threshold = queue_pressure_threshold
+        self.premium_guilds = set(premium_guilds or [])
+        self.queue_depth = queue_depth
+
+        self._requests: Dict[str, int] = defaultdict(int)
+        self._input_tokens: Dict[str, int] = defaultdict(int)
+        self._output_tokens: Dict[str, int] = defaultdict(int)
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=500))
+        self._reasons: Dict[str, int] = defaultdict(int)
+
+    def route(
+        self,
+        routing: Mapping[str, Any],
+        prompt_tokens: int,
+        server_id: Optional[str] = None
+    ) -> RoutingDecision:
+        """
+        :param routing: The active role's routing options from the roles YAML
+        :param prompt_tokens: Estimated input tokens of the request
+        :param server_id: Guild the request comes from
+        """
+        model = routing.get('model', self.default_model)
+        max_tokens = int(routing.get('max_tokens', self.default_max_tokens))
+        reason = "role" if routing else "default"
+
+        if prompt_tokens >= self.long_prompt_tokens and routing.get('long_prompt_model'):
+            model = routing['long_prompt_model']
+            reason = "long_prompt"
+
+        if server_id in self.premium_guilds:
+            if routing.get('premium_model'):
+                model = routing['premium_model']
+                reason = "premium"
+            if routing.get('premium_max_tokens'):
+                max_tokens = int(routing['premium_max_tokens'])
+                reason = "premium"
+
+        if self.queue_depth is not None and self.queue_depth() >= self.queue_pressure_threshold:
+            model = self.fast_model
+            max_tokens = min(max_tokens, self.degraded_max_tokens)
+            reason = "queue_pressure"
+
+        self._reasons[reason] += 1
+        return RoutingDecision(model=model, max_tokens=max_tokens, reason=reason)
+
+    def record_latency(self, model: str, latency: float):
+        self._requests[model] += 1
+        self._latencies[model].append(latency)
+
+    def record_usage(self, model: str, usage: Mapping):
+        self._input_tokens[model] += usage.get('input_tokens') or 0
+        self._output_tokens[model] += usage.get('output_tokens') or 0
+
+    def get_stats(self) -> Dict:
+        models = {}
+        for model, count in self._requests.items():
+            latencies = sorted(self._latencies[model])
+            models[model] = {
+                'requests': count,
+                'input_tokens': self._input_tokens[model],
+                'output_tokens': self._output_tokens[model],
+                'p50_latency': latencies[len(latencies) // 2] if latencies else 0.0,
+                'p95_latency': latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+            }
+        return {'models': models, 'routing_reasons': dict(self._reasons)}
@@ -1,26 +1,282 @@
 import asyncio
-from collections import defaultdict
-from typing import Dict, List, Optional, Callable, Awaitable
-from datetime import datetime
+import time
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+# Priority classes, served strictly in this order. Prefix commands never call
+# Claude (they only read or change bot state), so they run directly and need
+# no class of their own.
+PRIORITY_ADMIN = 0
+PRIORITY_MENTION = 1
+PRIORITIES = (PRIORITY_ADMIN, PRIORITY_MENTION)
+
+class QueueFullError(Exception):
+    """Raised by ``add_task`` when the global or per-guild queue bound is reached"""
+
+@dataclass
+class QueuedTask:
+    task: Callable[..., Awaitable]
+    args: Tuple
+    kwargs: Dict[str, Any]
+    channel_id: int
+    guild_id: Optional[str]
+    priority: int
+    cost: float = 1.0
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Monotonic time after which the task is skipped instead of run
+    expires_at: Optional[float] = None
+    on_expired: Optional[Callable[[], Awaitable]] = None
 
 class QueueService:
-    def __init__(self, max_concurrent: int = 3):
-        self.queues: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+    def __init__(
+        self,
+        max_concurrent: int = 3,
+        workers: int = 8,
+        max_per_guild: int = 4,
+        quantum: float = 1.0,
+        max_waiting: Optional[int] = None,
+        max_waiting_per_guild: Optional[int] = None,
+        initial_service_time: float = 5.0
+    ):
+        """
+        Fixed pool of workers shared by every guild and channel
+
+        Tasks are picked by strict priority class, then by deficit round-robin
+        across the guilds with queued work in that class, then round-robin
+        across the guild's channels. A guild never runs more than
+        ``max_per_guild`` tasks at once and a channel never more than
+        ``max_concurrent``, so one busy server cannot take over the pool.
+
+        :param max_concurrent: Tasks of one channel running at the same time
+        :param workers: Size of the global worker pool
+        :param max_per_guild: Tasks of one guild running at the same time
+        :param quantum: Cost credited to a guild each time its turn comes round
+        :param max_waiting: Queued (not yet running) tasks overall; unbounded if None
+        :param max_waiting_per_guild: Queued tasks of one guild; unbounded if None
+        :param initial_service_time: Assumed seconds per task until some have completed
+        """
         self.max_concurrent = max_concurrent
+        self.workers = workers
+        self.max_per_guild = max_per_guild
+        self.quantum = quantum
+        self.max_waiting = max_waiting
+        self.max_waiting_per_guild = max_waiting_per_guild
+        # Moving average of how long a task keeps a worker busy
+        self.service_time = initial_service_time
+
+        # priority -> guild -> channel -> FIFO of tasks
+        self._queues: Dict[int, Dict[Optional[str], "OrderedDict[int, Deque[QueuedTask]]"]] = {
+            priority: {} for priority in PRIORITIES
+        }
+        # priority -> guilds with queued work, in round-robin order
+        self._rings: Dict[int, Deque[Optional[str]]] = {priority: deque() for priority in PRIORITIES}
+        self._deficits: Dict[int, Dict[Optional[str], float]] = {priority: {} for priority in PRIORITIES}
+        self._queued = 0
+        self._class_queued: Dict[int, int] = {priority: 0 for priority in PRIORITIES}
+        self._guild_queued: Dict[Optional[str], int] = defaultdict(int)
+
         self.processing: Dict[int, int] = defaultdict(int)
-        self.tasks: List[asyncio.Task] = []
-
-    async def add_task(self, channel_id: int, task: Callable[..., Awaitable], *args, **kwargs):
-        await self.queues[channel_id].put((task, args, kwargs))
-        if self.processing[channel_id] < self.max_concurrent:
-            self.tasks.append(asyncio.create_task(self._process_queue(channel_id)))
-
-    async def _process_queue(self, channel_id: int):
-        self.processing[channel_id] += 1
-        try:
-            while not self.queues[channel_id].empty():
-                task, args, kwargs = await self.queues[channel_id].get()
-                await task(*args, **kwargs)
-                self.queues[channel_id].task_done()
-        finally:
-            self.processing[channel_id] -= 1
+        self.guild_processing: Dict[Optional[str], int] = defaultdict(int)
+        self._ready = asyncio.Condition()
+        self._workers: List[asyncio.Task] = []
+
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start the worker pool (idempotent; needs a running event loop)"""
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.workers:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def add_task(
+        self,
+        channel_id: int,
+        task: Callable[..., Awaitable],
+        *args,
+        guild_id: Optional[str] = None,
+        priority: int = PRIORITY_MENTION,
+        cost: float = 1.0,
+        deadline: Optional[float] = None,
+        on_expired: Optional[Callable[[], Awaitable]] = None,
+        **kwargs
+    ):
+        """
+        Queue ``task(*args, **kwargs)`` for the worker pool
+
+        :param guild_id: Guild the work is accounted to for fairness and caps
+        :param priority: One of the ``PRIORITY_*`` classes
+        :param cost: Relative cost of the task for deficit round-robin
+        :param deadline: Seconds the task may wait; once exceeded it is dropped
+            when dequeued and ``on_expired`` is awaited instead
+        :raises QueueFullError: If a queue bound is reached
+        """
+        if (
+            (self.max_waiting is not None and self._queued >= self.max_waiting)
+            or (
+                self.max_waiting_per_guild is not None
+                and self._guild_queued.get(guild_id, 0) >= self.max_waiting_per_guild
+            )
+        ):
+            self.rejected += 1
+            raise QueueFullError(f"Queue full for guild {guild_id}")
+
+        item = QueuedTask(
+            task=task,
+            args=args,
+            kwargs=kwargs,
+            channel_id=channel_id,
+            guild_id=guild_id,
+            priority=priority,
+            cost=cost,
+            expires_at=None if deadline is None else time.monotonic() + deadline,
+            on_expired=on_expired
+        )
+        guilds = self._queues[priority]
+        if guild_id not in guilds:
+            guilds[guild_id] = OrderedDict()
+            self._rings[priority].append(guild_id)
+            self._deficits[priority][guild_id] = 0.0
+        guilds[guild_id].setdefault(channel_id, deque()).append(item)
+        self._queued += 1
+        self._class_queued[priority] += 1
+        self._guild_queued[guild_id] += 1
+
+        self.start()
+        async with self._ready:
+            self._ready.notify()
+
+    def get_pending_count(self) -> int:
+        """Requests waiting in or being processed by any channel queue"""
+        return self._queued + sum(self.processing.values())
+
+    def estimate_wait(self, guild_id: Optional[str], priority: int = PRIORITY_MENTION) -> Tuple[int, float]:
+        """
+        Estimated queue position and seconds until a new task would start
+
+        Counts the work served before it (higher classes, plus a round-robin
+        share of its own class) and divides by the pool size; a guild already
+        at its concurrency cap is further limited by ``max_per_guild``.
+        """
+        ahead = sum(self._class_queued[higher] for higher in PRIORITIES if higher < priority)
+        active_guilds = len(self._rings[priority]) or 1
+        own = self._guild_queued.get(guild_id, 0) + 1
+        ahead += min(self._class_queued[priority], own * active_guilds)
+
+        busy = sum(self.processing.values())
+        pool_wait = max(0, ahead + busy - self.workers + 1) / self.workers
+        guild_backlog = own - 1 + self.guild_processing.get(guild_id, 0)
+        guild_wait = max(0, guild_backlog - self.max_per_guild + 1) / self.max_per_guild
+        return ahead + 1, max(pool_wait, guild_wait) * self.service_time
+
+    def _pick(self) -> Optional[QueuedTask]:
+        for priority in PRIORITIES:
+            item = self._pick_from_class(priority)
+            if item is not None:
+                return item
+        return None
+
+    def _pick_from_class(self, priority: int) -> Optional[QueuedTask]:
+        """Deficit round-robin over the guilds with queued work of one class"""
+        ring = self._rings[priority]
+        guilds = self._queues[priority]
+        deficits = self._deficits[priority]
+
+        blocked = 0
+        while ring and blocked < len(ring):
+            guild_id = ring[0]
+            channels = guilds[guild_id]
+            channel_id = None
+            if self.guild_processing[guild_id] < self.max_per_guild:
+                channel_id = next(
+                    (cid for cid in channels if self.processing[cid] < self.max_concurrent),
+                    None
+                )
+            if channel_id is None:
+                # Capped guild or every channel busy: let the others go first
+                ring.rotate(-1)
+                blocked += 1
+                continue
+
+            item = channels[channel_id][0]
+            if deficits[guild_id] < item.cost:
+                deficits[guild_id] += self.quantum
+                ring.rotate(-1)
+                blocked = 0
+                continue
+
+            deficits[guild_id] -= item.cost
+            channels[channel_id].popleft()
+            if channels[channel_id]:
+                channels.move_to_end(channel_id)
+            else:
+                del channels[channel_id]
+            if not channels:
+                ring.popleft()
+                del guilds[guild_id]
+                del deficits[guild_id]
+            self._queued -= 1
+            self._class_queued[priority] -= 1
+            self._guild_queued[guild_id] -= 1
+            if not self._guild_queued[guild_id]:
+                del self._guild_queued[guild_id]
+            return item
+        return None
+
+    async def _worker(self):
+        while True:
+            async with self._ready:
+                item = self._pick()
+                while item is None:
+                    await self._ready.wait()
+                    item = self._pick()
+                self.processing[item.channel_id] += 1
+                self.guild_processing[item.guild_id] += 1
+
+            started = time.monotonic()
+            try:
+                if item.expires_at is not None and started > item.expires_at:
+                    # Waited past its deadline; do not spend API capacity on it
+                    self.expired += 1
+                    if item.on_expired is not None:
+                        await item.on_expired()
+                else:
+                    await item.task(*item.args, **item.kwargs)
+                    self.completed += 1
+                    self.service_time += 0.2 * (time.monotonic() - started - self.service_time)
+            except Exception as e:
+                self.failed += 1
+                print(f"Error in queued task for channel {item.channel_id}: {e}")
+            finally:
+                self.processing[item.channel_id] -= 1
+                if not self.processing[item.channel_id]:
+                    del self.processing[item.channel_id]
+                self.guild_processing[item.guild_id] -= 1
+                if not self.guild_processing[item.guild_id]:
+                    del self.guild_processing[item.guild_id]
+                async with self._ready:
+                    # A cap was released, so work another worker skipped may now run
+                    self._ready.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'queue_workers': len(self._workers),
+            'queue_waiting': self._queued,
+            'queue_running': sum(self.processing.values()),
+            'queue_waiting_by_priority': dict(self._class_queued),
+            'queue_busy_guilds': len(self.guild_processing),
+            'queue_completed': self.completed,
+            'queue_failed': self.failed,
+            'queue_expired': self.expired,
+            'queue_rejected': self.rejected,
+            'queue_service_time': self.service_time
+        }
@@ -1,93 +1,221 @@
 import asyncio
-from typing import Dict, Any
-from datetime import datetime, timedelta
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Tuple
+
+# Idle keys dropped per call, so eviction stays O(1) per check
+_SWEEP_BATCH = 16
+
+DEFAULT_SCOPE = 'default'
+
+class RateLimitExceeded(Exception):
+    """Raised by ``acquire`` when the call could not be admitted within ``max_wait``"""
+
+    def __init__(self, retry_after: float, scope: str):
+        super().__init__(f"Rate limit for {scope} exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.scope = scope
+
+@dataclass(frozen=True)
+class RateLimit:
+    calls: int
+    # Seconds in which ``calls`` are allowed
+    period: float
+    # Calls that may be made back to back; defaults to ``calls``
+    burst: Optional[int] = None
+
+class _Scope:
+    __slots__ = ('name', 'interval', 'tolerance', 'tats')
+
+    def __init__(self, name: str, limit: RateLimit):
+        self.name = name
+        # Time one call "uses up" and how far ahead of now usage may run
+        self.interval = limit.period / limit.calls
+        self.tolerance = self.interval * (limit.burst or limit.calls)
+        # key -> theoretical arrival time, least recently updated first
+        self.tats: "OrderedDict[Hashable, float]" = OrderedDict()
 
 class RateLimiter:
     def __init__(
-        self, 
-        max_calls: int = 10, 
-        period: timedelta = timedelta(minutes=1)
+        self,
+        max_calls: int = 10,
+        period: timedelta = timedelta(minutes=1),
+        limits: Optional[Mapping[str, RateLimit]] = None,
+        clock: Callable[[], float] = time.monotonic
     ):
         """
-        Initialize rate limiter
-        
-        :param max_calls: Maximum number of calls allowed in the given period
-        :param period: Time window for rate limiting
+        Rate limiter using the generic cell rate algorithm (GCRA)
+
+        Each key stores a single timestamp, its theoretical arrival time, so a
+        check is O(1) whatever the limit. Limits are grouped in scopes (e.g.
+        user, channel, guild, global) and one call checks and consumes every
+        scope at once. A key whose bucket has refilled carries no state and is
+        evicted as the limiter is used.
+
+        :param max_calls: Calls per period of the default scope, used when no
+            ``limits`` are given
+        :param period: Time window of the default scope
+        :param limits: Limit per scope name; scopes missing from a call's keys
+            are not checked
+        :param clock: Monotonic time source in seconds
         """
-        self.max_calls = max_calls
-        self.period = period
-        self._calls: Dict[str, list] = {}
+        if limits is None:
+            limits = {DEFAULT_SCOPE: RateLimit(max_calls, period.total_seconds())}
+        self._scopes: Dict[str, _Scope] = {
+            name: _Scope(name, limit) for name, limit in limits.items()
+        }
+        self._clock = clock
+
+        self.allowed = 0
+        self.limited = 0
+        self.waited = 0
+        self.evicted = 0
+
+    def _resolve(self, keys) -> List[Tuple[_Scope, Hashable]]:
+        if not isinstance(keys, Mapping):
+            keys = {DEFAULT_SCOPE: keys}
+        return [(self._scopes[name], key) for name, key in keys.items() if name in self._scopes]
+
+    def _sweep(self, scope: _Scope, now: float):
+        tats = scope.tats
+        for _ in range(_SWEEP_BATCH):
+            if not tats:
+                return
+            key, tat = next(iter(tats.items()))
+            if tat > now:
+                return
+            del tats[key]
+            self.evicted += 1
 
-    def _cleanup_old_calls(self, key: str):
+    def _reserve(self, keys, cost: float) -> Tuple[float, Optional[str], List[Tuple[_Scope, Hashable, float]]]:
         """
-        Remove calls older than the specified period
-        
-        :param key: Unique identifier for the rate limit group
+        Work out how long a call must wait and the arrival times it would set
+
+        :return: Seconds to wait, the scope that imposes it, and the new
+            arrival time of every key
         """
-        now = datetime.now()
-        self._calls[key] = [
-            call_time for call_time in self._calls.get(key, [])
-            if now - call_time < self.period
-        ]
+        now = self._clock()
+        wait = 0.0
+        limiting = None
+        updates = []
+        for scope, key in self._resolve(keys):
+            self._sweep(scope, now)
+            tat = max(scope.tats.get(key, now), now) + scope.interval * cost
+            key_wait = tat - scope.tolerance - now
+            if key_wait > wait:
+                wait = key_wait
+                limiting = scope.name
+            updates.append((scope, key, tat))
+        return wait, limiting, updates
+
+    @staticmethod
+    def _commit(updates: List[Tuple[_Scope, Hashable, float]]):
+        for scope, key, tat in updates:
+            scope.tats[key] = tat
+            scope.tats.move_to_end(key)
 
-    def is_allowed(self, key: str) -> bool:
+    def try_acquire(self, keys, cost: float = 1.0) -> float:
         """
-        Check if a call is allowed
-        
-        :param key: Unique identifier for the rate limit group
+        Consume one call from every scope if all of them allow it
+
+        :param keys: Key per scope name, e.g. ``{'user': user_id, 'guild': guild_id}``;
+            a bare key is checked against the default scope
+        :param cost: Calls consumed
+        :return: 0 if the call was admitted, otherwise seconds until it would be
+        """
+        wait, _, updates = self._reserve(keys, cost)
+        if wait > 0:
+            self.limited += 1
+            return wait
+        self._commit(updates)
+        self.allowed += 1
+        return 0.0
+
+    async def acquire(self, keys, cost: float = 1.0, max_wait: Optional[float] = None):
+        """
+        Wait until every scope allows the call, then consume it
+
+        The call's slot is reserved up front, so waiters are served in arrival
+        order and each sleeps exactly until its slot, without polling.
+
+        :param max_wait: Longest acceptable wait in seconds; unbounded if None
+        :raises RateLimitExceeded: If the wait would exceed ``max_wait``
+        """
+        wait, limiting, updates = self._reserve(keys, cost)
+        if max_wait is not None and wait > max_wait:
+            self.limited += 1
+            raise RateLimitExceeded(wait, limiting)
+
+        self._commit(updates)
+        if wait > 0:
+            self.waited += 1
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Give the slot back; later waiters keep theirs
+                for scope, key, _ in updates:
+                    if key in scope.tats:
+                        scope.tats[key] -= scope.interval * cost
+                raise
+        self.allowed += 1
+
+    def is_allowed(self, keys) -> bool:
+        """
+        Check if a call is allowed, consuming it if so
+
+        :param keys: Key per scope name, or a bare key for the default scope
         :return: Boolean indicating if the call is allowed
         """
-        now = datetime.now()
-        
-        # Cleanup old calls
-        self._cleanup_old_calls(key)
-        
-        # Check if within rate limit
-        if len(self._calls.get(key, [])) < self.max_calls:
-            # Record the call
-            if key not in self._calls:
-                self._calls[key] = []
-            self._calls[key].append(now)
-            return True
-        
-        return False
+        return self.try_acquire(keys) == 0
 
     async def wait_and_execute(
-        self, 
-        key: str, 
-        func: Any, 
-        *args, 
+        self,
+        keys,
+        func: Any,
+        *args,
         **kwargs
     ):
         """
-        Wait and execute a function if rate limit allows
-        
-        :param key: Unique identifier for the rate limit group
+        Wait until the rate limit allows the call, then execute ``func``
+
+        :param keys: Key per scope name, or a bare key for the default scope
         :param func: Function to execute
-        :param args: Positional arguments for the function
-        :param kwargs: Keyword arguments for the function
         :return: Result of the function
         """
-        while not self.is_allowed(key):
-            await asyncio.sleep(1)  # Wait if rate limited
-        
+        await self.acquire(keys)
         return await func(*args, **kwargs)
 
-    def get_remaining_calls(self, key: str) -> int:
+    def get_remaining_calls(self, keys) -> int:
         """
-        Get remaining calls for a specific key
-        
-        :param key: Unique identifier for the rate limit group
-        :return: Number of remaining calls
+        Calls that could be made right now without waiting
+
+        :param keys: Key per scope name, or a bare key for the default scope
+        :return: Number of remaining calls in the most constrained scope
         """
-        self._cleanup_old_calls(key)
-        return max(0, self.max_calls - len(self._calls.get(key, [])))
+        now = self._clock()
+        remaining = None
+        for scope, key in self._resolve(keys):
+            used = max(scope.tats.get(key, now), now) - now
+            calls = max(0, int((scope.tolerance - used) / scope.interval + 1e-9))
+            remaining = calls if remaining is None else min(remaining, calls)
+        return remaining or 0
 
-    def reset_key(self, key: str):
+    def reset_key(self, keys):
         """
-        Reset calls for a specific key
-        
-        :param key: Unique identifier for the rate limit group
+        Forget the calls made by the given keys
+
+        :param keys: Key per scope name, or a bare key for the default scope
         """
-        if key in self._calls:
-            del self._calls[key]
+        for scope, key in self._resolve(keys):
+            scope.tats.pop(key, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'ratelimit_keys': sum(len(scope.tats) for scope in self._scopes.values()),
+            'ratelimit_allowed': self.allowed,
+            'ratelimit_limited': self.limited,
+            'ratelimit_waited': self.waited,
+            'ratelimit_evicted': self.evicted
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# Callers that may be cancelled set this to a list; each cancellation that
+# reaches the coalescer appends whether it also stopped the upstream request
+# (False when other callers are still waiting for it)
+upstream_cancellations: ContextVar[Optional[List[bool]]] = ContextVar('upstream_cancellations', default=None)
+
+def _report_cancellation(stopped: bool):
+    report = upstream_cancellations.get()
+    if report is not None:
+        report.append(stopped)
+
+class _SharedStream:
+    def __init__(
+        self,
+        source: AsyncIterator[str],
+        on_done: Callable[[], None],
+        on_cancel: Callable[[], None]
+    ):
+        """
+        Fan a single async stream out to any number of subscribers
+
+        Subscribers joining late replay the chunks received so far.
+        """
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._on_done = on_done
+        self._on_cancel = on_cancel
+        self.task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._on_done()
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None and not isinstance(self.error, asyncio.CancelledError):
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.done:
+                # Nobody is listening any more, stop spending API time on it
+                stopped = self.subscribers == 0
+                if stopped:
+                    self.task.cancel()
+                    self._on_cancel()
+                _report_cancellation(stopped)
+
+class _SharedCall:
+    def __init__(self, future: asyncio.Future, on_cancel: Callable[[], None]):
+        """
+        A single in-flight request awaited by any number of callers
+
+        The request is cancelled once every caller waiting for it was cancelled.
+        """
+        self.future = future
+        self.waiters = 0
+        self._on_cancel = on_cancel
+
+    async def wait(self) -> Any:
+        self.waiters += 1
+        try:
+            # Shield so one caller giving up does not cancel the others
+            return await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            stopped = self.waiters == 1 and not self.future.done()
+            if stopped:
+                self.future.cancel()
+                self._on_cancel()
+            _report_cancellation(stopped)
+            raise
+        finally:
+            self.waiters -= 1
+
+class RequestCoalescer:
+    def __init__(self):
+        """
+        Single-flight deduplication of identical in-flight requests
+
+        The first caller for a key performs the request; callers arriving while
+        it is in flight await the same result instead of sending a duplicate.
+        A request is cancelled when the last caller waiting for it is.
+        """
+        self._in_flight: Dict[str, _SharedCall] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self.requests = 0
+        self.deduplicated = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def make_key(payload: Dict) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await the in-flight request for ``key`` or start it with ``factory``
+        """
+        self.requests += 1
+        call = self._in_flight.get(key)
+        if call is not None:
+            self.deduplicated += 1
+        else:
+            call = _SharedCall(asyncio.ensure_future(factory()), self._count_cancel)
+            self._in_flight[key] = call
+            call.future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        return await call.wait()
+
+    def _count_cancel(self):
+        self.cancelled += 1
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Subscribe to the in-flight stream for ``key`` or start it with ``factory``
+        """
+        self.requests += 1
+        shared = self._streams.get(key)
+        if shared is not None:
+            self.deduplicated += 1
+        else:
+            shared = _SharedStream(factory(), lambda: self._streams.pop(key, None), self._count_cancel)
+            self._streams[key] = shared
+        return shared.subscribe()
+
+    def get_stats(self) -> Dict:
+        return {
+            'coalescer_requests': self.requests,
+            'coalescer_deduplicated': self.deduplicated,
+            'coalescer_cancelled': self.cancelled,
+            'coalescer_in_flight': len(self._in_flight) + len(self._streams)
+        }
@@ -0,0 +1,303 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+import aiohttp
+
+T = TypeVar('T')
+
+# 529 is Anthropic's "overloaded" status
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Statuses that indicate the service itself is degraded (not just busy for us)
+BREAKER_STATUSES = {500, 502, 503, 504, 529}
+
+class ClaudeAPIError(Exception):
+    def __init__(
+        self,
+        status: int,
+        message: str,
+        retry_after: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        super().__init__(f"API Error {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+        self.headers = headers or {}
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Claude API is temporarily unavailable, retrying in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Read the server's requested back-off from response headers, in seconds
+    """
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """
+        Fast-fail calls to an endpoint after repeated failures
+
+        :param failure_threshold: Consecutive failures that open the circuit
+        :param recovery_timeout: Seconds to stay open before letting a probe through
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # Half-open: a single probe decides whether to close again
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def retry_in(self) -> float:
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def release(self):
+        """Give back a half-open probe slot that ended without a verdict"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+class ResilientCaller:
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        hedge_after: Optional[float] = None
+    ):
+        """
+        Retry with jittered exponential backoff behind per-endpoint circuit breakers
+
+        :param max_retries: Retries after the first attempt
+        :param base_delay: Backoff for the first retry, doubled each attempt
+        :param max_delay: Upper bound for a single backoff wait; a server
+            retry-after longer than this fails the call instead of retrying early
+        :param failure_threshold: Consecutive failures that open an endpoint's breaker
+        :param recovery_timeout: Seconds an open breaker waits before probing
+        :param hedge_after: Seconds before a duplicate request is raced against a
+            slow one (non-streaming only); None disables hedging
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.hedge_after = hedge_after
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+        self.retries = 0
+        self.retry_wait_seconds = 0.0
+        self.retry_after_exceeded = 0
+        self.breaker_rejections = 0
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    def get_breaker(self, endpoint: str) -> CircuitBreaker:
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.recovery_timeout)
+        return self.breakers[endpoint]
+
+    def _is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, ClaudeAPIError):
+            return error.status in RETRYABLE_STATUSES
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    def _counts_against_breaker(self, error: BaseException) -> bool:
+        if isinstance(error, ClaudeAPIError):
+            return error.status in BREAKER_STATUSES
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Full-jitter exponential backoff, never shorter than the server's retry-after
+
+        Only the jitter is capped at ``max_delay``; callers fail fast rather than
+        wait out a retry-after beyond it (see ``_should_retry``).
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _should_retry(self, attempt: int, error: BaseException) -> bool:
+        if attempt >= self.max_retries or not self._is_retryable(error):
+            return False
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None and retry_after > self.max_delay:
+            # Retrying sooner would only earn another 429; the error carries
+            # retry_after for the caller
+            self.retry_after_exceeded += 1
+            return False
+        return True
+
+    def _admit(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.get_breaker(endpoint)
+        if not breaker.allow():
+            self.breaker_rejections += 1
+            raise CircuitOpenError(endpoint, breaker.retry_in())
+        return breaker
+
+    def _record(self, breaker: CircuitBreaker, error: Optional[BaseException]):
+        if error is None:
+            breaker.record_success()
+        elif self._counts_against_breaker(error):
+            breaker.record_failure()
+        else:
+            # The endpoint answered; it just did not like this request
+            breaker.record_success()
+
+    async def _backoff(self, attempt: int, error: BaseException):
+        delay = self.backoff_delay(attempt, getattr(error, 'retry_after', None))
+        self.retries += 1
+        self.retry_wait_seconds += delay
+        await asyncio.sleep(delay)
+
+    async def _hedged(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Race a second copy of a slow request and keep whichever finishes first
+        """
+        primary = asyncio.ensure_future(factory())
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        self.hedges_started += 1
+        hedge = asyncio.ensure_future(factory())
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, endpoint: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run ``factory`` with retries, backoff and the endpoint's circuit breaker
+        """
+        attempt = 0
+        while True:
+            breaker = self._admit(endpoint)
+            try:
+                if self.hedge_after:
+                    result = await self._hedged(factory)
+                else:
+                    result = await factory()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                self._record(breaker, e)
+                if not self._should_retry(attempt, e):
+                    raise
+                await self._backoff(attempt, e)
+                attempt += 1
+                continue
+
+            self._record(breaker, None)
+            return result
+
+    async def stream(self, endpoint: str, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Streaming variant of ``call``; only retries before the first chunk arrives
+        """
+        attempt = 0
+        while True:
+            breaker = self._admit(endpoint)
+            started = False
+            try:
+                async for chunk in factory():
+                    if not started:
+                        started = True
+                        breaker.record_success()
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                if not started:
+                    breaker.release()
+                raise
+            except Exception as e:
+                self._record(breaker, e)
+                if started or not self._should_retry(attempt, e):
+                    raise
+                await self._backoff(attempt, e)
+                attempt += 1
+                continue
+
+            if not started:
+                self._record(breaker, None)
+            return
+
+    def get_stats(self) -> Dict:
+        return {
+            'retries': self.retries,
+            'retry_wait_seconds': round(self.retry_wait_seconds, 2),
+            'retry_after_exceeded': self.retry_after_exceeded,
+            'breaker_rejections': self.breaker_rejections,
+            'hedges_started': self.hedges_started,
+            'hedges_won': self.hedges_won,
+            'breakers': {
+                endpoint: breaker.state for endpoint, breaker in self.breakers.items()
+            }
+        }
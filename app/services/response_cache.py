@@ -0,0 +1,140 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 5 * 1024 * 1024,
+        ttl_seconds: float = 3600.0,
+        context_aware: bool = True,
+        disabled_guilds: Optional[Iterable[str]] = None
+    ):
+        """
+        LRU cache of Claude responses for repeated questions
+
+        :param max_entries: Maximum number of cached responses
+        :param max_bytes: Maximum total size of cached keys and responses
+        :param ttl_seconds: Seconds a cached response stays valid
+        :param context_aware: Include a hash of the conversation history in the key;
+            when off, only prompts without prior history are cached, since a
+            follow-up like "why?" means something different in every conversation
+        :param disabled_guilds: Guild ids that opted out of caching
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.context_aware = context_aware
+        self.disabled_guilds: Set[str] = set(disabled_guilds or [])
+
+        # key -> (expires_at, response, size)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        """
+        Normalize a prompt so trivially different phrasings share a key
+        """
+        message = _WHITESPACE.sub(' ', message.casefold()).strip()
+        return _TRAILING_PUNCTUATION.sub('', message)
+
+    def make_key(
+        self,
+        system_prompt: str,
+        message: str,
+        history: Optional[List[Dict]] = None,
+        model: str = "",
+        max_tokens: int = 0
+    ) -> Optional[str]:
+        """
+        Key of a request, or None if its answer must not be shared
+
+        :param model: Model the request was routed to
+        :param max_tokens: Output budget the request was routed with
+        """
+        if history and not self.context_aware:
+            return None
+        digest = hashlib.sha256()
+        digest.update(f"{model}\x00{max_tokens}\x00".encode())
+        digest.update(system_prompt.encode())
+        digest.update(b'\x00')
+        digest.update(self.normalize(message).encode())
+        if history:
+            digest.update(b'\x00')
+            digest.update(json.dumps(history, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def is_enabled(self, server_id: Optional[str]) -> bool:
+        return server_id not in self.disabled_guilds
+
+    def set_guild_enabled(self, server_id: str, enabled: bool):
+        if enabled:
+            self.disabled_guilds.discard(server_id)
+        else:
+            self.disabled_guilds.add(server_id)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, response, size = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def put(self, key: str, response: str):
+        size = len(key) + len(response.encode())
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
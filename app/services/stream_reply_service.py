@@ -0,0 +1,160 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional
+
+import discord
+
+DISCORD_MESSAGE_LIMIT = 2000
+# Appended when a stream fails after part of the answer was shown
+STREAM_INTERRUPTED_MARKER = "\n\n*[response interrupted]*"
+
+@dataclass
+class StreamedReply:
+    text: str = ""
+    messages: List[discord.Message] = field(default_factory=list)
+    first_sent_at: Optional[float] = None
+    edits: int = 0
+
+class StreamReplyService:
+    def __init__(
+        self,
+        edit_interval: float = 1.0,
+        max_length: int = DISCORD_MESSAGE_LIMIT
+    ):
+        """
+        Turn a stream of text deltas into a progressively edited Discord reply
+
+        :param edit_interval: Minimum seconds between edits of the same message,
+            keeps us under Discord's per-channel edit rate limit
+        :param max_length: Character limit of a single Discord message
+        """
+        self.edit_interval = edit_interval
+        self.max_length = max_length
+
+    def _split_point(self, text: str) -> int:
+        """
+        Find where to cut an overflowing message, preferring line then word breaks
+        """
+        window = text[:self.max_length]
+        for separator in ('\n', ' '):
+            index = window.rfind(separator)
+            if index >= self.max_length // 2:
+                return index + 1
+        return self.max_length
+
+    async def reply(
+        self,
+        message: discord.Message,
+        chunks: AsyncIterator[str],
+        empty_text: str = "I couldn't generate a response. Please try again."
+    ) -> StreamedReply:
+        """
+        Reply to ``message`` while ``chunks`` is still being generated
+
+        The first message is posted as soon as the first text arrives. Later
+        deltas are coalesced into edits spaced ``edit_interval`` apart, and the
+        reply rolls over to a new message at the character limit. Every send
+        and edit after the first message, including rollovers, respects
+        ``edit_interval``.
+
+        If the task is cancelled mid-stream, the last message shown gets
+        ``STREAM_INTERRUPTED_MARKER`` so a cut-short answer is not mistaken for
+        a complete one.
+        """
+        result = StreamedReply()
+        current_message: Optional[discord.Message] = None
+        current_text = ""
+        shown_text = ""
+        last_update = 0.0
+        # Content of the newest message posted, as last sent or edited
+        last_text = ""
+
+        async def send(content: str) -> discord.Message:
+            nonlocal last_text
+            if not result.messages:
+                sent = await message.reply(content)
+                result.first_sent_at = time.monotonic()
+            else:
+                sent = await message.channel.send(content)
+            result.messages.append(sent)
+            last_text = content
+            return sent
+
+        async def edit(target: discord.Message, content: str):
+            nonlocal last_text
+            await target.edit(content=content)
+            result.edits += 1
+            if target is result.messages[-1]:
+                last_text = content
+
+        async def pace():
+            # Only the very first message may skip the interval
+            if result.messages:
+                delay = last_update + self.edit_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        try:
+            async for chunk in chunks:
+                result.text += chunk
+                current_text += chunk
+
+                # Seal full messages and carry the overflow into a new one
+                while len(current_text) > self.max_length:
+                    cut = self._split_point(current_text)
+                    head, current_text = current_text[:cut], current_text[cut:]
+                    if current_message is None:
+                        await pace()
+                        await send(head)
+                    elif head != shown_text:
+                        await pace()
+                        await edit(current_message, head)
+                    current_message = None
+                    shown_text = ""
+                    last_update = time.monotonic()
+
+                if not current_text.strip():
+                    continue
+
+                now = time.monotonic()
+                if current_message is None and not result.messages:
+                    # Time to first visible token is what users perceive, so the
+                    # very first message is never held back
+                    current_message = await send(current_text)
+                    shown_text = current_text
+                    last_update = now
+                elif now - last_update >= self.edit_interval:
+                    if current_message is None:
+                        current_message = await send(current_text)
+                    else:
+                        await edit(current_message, current_text)
+                    shown_text = current_text
+                    last_update = now
+
+            if current_text.strip() and current_text != shown_text:
+                await pace()
+                if current_message is None:
+                    await send(current_text)
+                else:
+                    await edit(current_message, current_text)
+        except asyncio.CancelledError:
+            if result.messages:
+                await self._mark_interrupted(result.messages[-1], last_text)
+            raise
+
+        if not result.messages:
+            await send(empty_text)
+
+        return result
+
+    async def _mark_interrupted(self, sent: discord.Message, text: str):
+        """Finish a reply that was cut short with ``STREAM_INTERRUPTED_MARKER``"""
+        try:
+            if len(text) + len(STREAM_INTERRUPTED_MARKER) <= self.max_length:
+                await sent.edit(content=text + STREAM_INTERRUPTED_MARKER)
+            else:
+                # A full message keeps its text; the marker follows on its own
+                await sent.channel.send(STREAM_INTERRUPTED_MARKER.strip())
+        except Exception as e:
+            print(f"Error marking interrupted reply: {e}")
@@ -10,6 +10,7 @@ class BotConfig:
     """
     discord_token: str = field(default_factory=lambda: os.getenv('DISCORD_TOKEN', ''))
     claude_api_key: str = field(default_factory=lambda: os.getenv('CLAUDE_API_KEY', ''))
+    claude_api_keys: List[str] = field(default_factory=list)
     
     # Advanced configuration options
     allowed_guilds: List[int] = field(default_factory=list)
@@ -19,8 +20,96 @@ class BotConfig:
     log_level: str = 'INFO'
     error_webhook_url: Optional[str] = None
     
-    # Rate limiting
+    # Rate limiting (mentions per minute; 0 disables a scope)
     max_messages_per_minute: int = 10
+    channel_messages_per_minute: int = 30
+    guild_messages_per_minute: int = 60
+    global_messages_per_minute: int = 300
+    # Seconds a mention may wait for the rate limit before it is refused
+    rate_limit_max_wait: float = 5.0
+    
+    # Outbound HTTP connection pool
+    http_pool_limit: int = 100
+    http_pool_limit_per_host: int = 20
+    http_keepalive_timeout: float = 30.0
+    http_dns_cache_ttl: int = 300
+    http_connect_timeout: float = 10.0
+    claude_request_timeout: float = 30.0
+    
+    # Claude API
+    anthropic_api_url: Optional[str] = None
+    prompt_caching: bool = True
+    prompt_cache_min_tokens: int = 1024
+    
+    # Retries and circuit breaking for the Claude API
+    claude_max_retries: int = 3
+    claude_retry_base_delay: float = 0.5
+    claude_retry_max_delay: float = 20.0
+    claude_breaker_threshold: int = 5
+    claude_breaker_recovery: float = 30.0
+    claude_hedge_after: Optional[float] = None
+    
+    # Model routing
+    claude_model: str = "claude-3-5-haiku-20241022"
+    claude_fast_model: str = "claude-3-5-haiku-20241022"
+    claude_max_tokens: int = 1000
+    degraded_max_tokens: int = 500
+    long_prompt_tokens: int = 4000
+    queue_pressure_threshold: int = 20
+    premium_guilds: List[str] = field(default_factory=list)
+    
+    # Claude API budget of each API key, shared by every channel
+    claude_requests_per_minute: int = 50
+    claude_tokens_per_minute: int = 50000
+    claude_max_concurrency: int = 16
+    
+    # Worker pool processing mentions across all guilds
+    queue_workers: int = 8
+    queue_max_per_guild: int = 4
+    queue_max_per_channel: int = 3
+    queue_max_waiting: int = 200
+    queue_max_waiting_per_guild: int = 30
+    admission_deadline: float = 60.0
+    admission_notify_after: float = 10.0
+    # Merge mentions arriving in one channel within this many seconds (0 disables)
+    mention_batch_window: float = 0.0
+    mention_batch_max: int = 5
+    # Handle each Discord message id at most once within this many seconds
+    message_dedupe_window: float = 600.0
+    message_dedupe_max_entries: int = 10000
+    
+    # Response cache for repeated questions (opt-in)
+    response_cache_enabled: bool = False
+    response_cache_max_entries: int = 1000
+    response_cache_max_bytes: int = 5 * 1024 * 1024
+    response_cache_ttl: float = 3600.0
+    response_cache_context_aware: bool = True
+    response_cache_disabled_guilds: List[str] = field(default_factory=list)
+    
+    # Conversation context
+    context_token_budget: int = 2000
+    max_channel_tokens: int = 20000
+    max_channel_bytes: int = 256 * 1024
+    max_resident_channels: int = 5000
+    max_resident_bytes: int = 64 * 1024 * 1024
+    conversation_idle_ttl: float = 6 * 3600
+    conversation_spill_dir: Optional[str] = None
+    conversation_compress_after: float = 600
+    
+    # Write-behind persistence of conversations to Postgres
+    persist_conversations: bool = False
+    persist_flush_interval: float = 2.0
+    persist_batch_size: int = 200
+    
+    # Rolling summarization of long conversations
+    summarize_conversations: bool = True
+    summary_model: Optional[str] = None
+    summary_threshold_tokens: int = 4000
+    summary_keep_tokens: int = 2000
+    
+    # Streaming replies
+    stream_responses: bool = True
+    stream_edit_interval: float = 1.0
     
     @classmethod
     def load(cls):
@@ -31,6 +120,11 @@ class BotConfig:
         return cls(
             discord_token=os.getenv('DISCORD_TOKEN', ''),
             claude_api_key=os.getenv('CLAUDE_API_KEY', ''),
+            claude_api_keys=[
+                key.strip() for key in
+                os.getenv('CLAUDE_API_KEYS', '').split(',')
+                if key.strip()
+            ],
             allowed_guilds=[
                 int(guild_id) for guild_id in 
                 os.getenv('ALLOWED_GUILDS', '').split(',') 
@@ -45,7 +139,78 @@ class BotConfig:
             error_webhook_url=os.getenv('ERROR_WEBHOOK_URL'),
             max_messages_per_minute=int(
                 os.getenv('MAX_MESSAGES_PER_MINUTE', '10')
-            )
+            ),
+            channel_messages_per_minute=int(os.getenv('CHANNEL_MESSAGES_PER_MINUTE', '30')),
+            guild_messages_per_minute=int(os.getenv('GUILD_MESSAGES_PER_MINUTE', '60')),
+            global_messages_per_minute=int(os.getenv('GLOBAL_MESSAGES_PER_MINUTE', '300')),
+            rate_limit_max_wait=float(os.getenv('RATE_LIMIT_MAX_WAIT', '5')),
+            http_pool_limit=int(os.getenv('HTTP_POOL_LIMIT', '100')),
+            http_pool_limit_per_host=int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20')),
+            http_keepalive_timeout=float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '30')),
+            http_dns_cache_ttl=int(os.getenv('HTTP_DNS_CACHE_TTL', '300')),
+            http_connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '10')),
+            claude_request_timeout=float(os.getenv('CLAUDE_REQUEST_TIMEOUT', '30')),
+            anthropic_api_url=os.getenv('ANTHROPIC_API_URL'),
+            prompt_caching=os.getenv('PROMPT_CACHING', 'true').lower() in ('1', 'true', 'yes'),
+            prompt_cache_min_tokens=int(os.getenv('PROMPT_CACHE_MIN_TOKENS', '1024')),
+            claude_max_retries=int(os.getenv('CLAUDE_MAX_RETRIES', '3')),
+            claude_retry_base_delay=float(os.getenv('CLAUDE_RETRY_BASE_DELAY', '0.5')),
+            claude_retry_max_delay=float(os.getenv('CLAUDE_RETRY_MAX_DELAY', '20')),
+            claude_breaker_threshold=int(os.getenv('CLAUDE_BREAKER_THRESHOLD', '5')),
+            claude_breaker_recovery=float(os.getenv('CLAUDE_BREAKER_RECOVERY', '30')),
+            claude_hedge_after=float(os.getenv('CLAUDE_HEDGE_AFTER', '0')) or None,
+            claude_model=os.getenv('CLAUDE_MODEL', 'claude-3-5-haiku-20241022'),
+            claude_fast_model=os.getenv('CLAUDE_FAST_MODEL', 'claude-3-5-haiku-20241022'),
+            claude_max_tokens=int(os.getenv('CLAUDE_MAX_TOKENS', '1000')),
+            degraded_max_tokens=int(os.getenv('DEGRADED_MAX_TOKENS', '500')),
+            long_prompt_tokens=int(os.getenv('LONG_PROMPT_TOKENS', '4000')),
+            queue_pressure_threshold=int(os.getenv('QUEUE_PRESSURE_THRESHOLD', '20')),
+            premium_guilds=[
+                guild_id.strip() for guild_id in
+                os.getenv('PREMIUM_GUILDS', '').split(',')
+                if guild_id.strip()
+            ],
+            claude_requests_per_minute=int(os.getenv('CLAUDE_REQUESTS_PER_MINUTE', '50')),
+            claude_tokens_per_minute=int(os.getenv('CLAUDE_TOKENS_PER_MINUTE', '50000')),
+            claude_max_concurrency=int(os.getenv('CLAUDE_MAX_CONCURRENCY', '16')),
+            queue_workers=int(os.getenv('QUEUE_WORKERS', '8')),
+            queue_max_per_guild=int(os.getenv('QUEUE_MAX_PER_GUILD', '4')),
+            queue_max_per_channel=int(os.getenv('QUEUE_MAX_PER_CHANNEL', '3')),
+            queue_max_waiting=int(os.getenv('QUEUE_MAX_WAITING', '200')),
+            queue_max_waiting_per_guild=int(os.getenv('QUEUE_MAX_WAITING_PER_GUILD', '30')),
+            admission_deadline=float(os.getenv('ADMISSION_DEADLINE', '60')),
+            admission_notify_after=float(os.getenv('ADMISSION_NOTIFY_AFTER', '10')),
+            mention_batch_window=int(os.getenv('MENTION_BATCH_WINDOW_MS', '0')) / 1000,
+            mention_batch_max=int(os.getenv('MENTION_BATCH_MAX', '5')),
+            message_dedupe_window=float(os.getenv('MESSAGE_DEDUPE_WINDOW', '600')),
+            message_dedupe_max_entries=int(os.getenv('MESSAGE_DEDUPE_MAX_ENTRIES', '10000')),
+            response_cache_enabled=os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+            response_cache_max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+            response_cache_max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(5 * 1024 * 1024))),
+            response_cache_ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+            response_cache_context_aware=os.getenv('RESPONSE_CACHE_CONTEXT_AWARE', 'true').lower() in ('1', 'true', 'yes'),
+            response_cache_disabled_guilds=[
+                guild_id.strip() for guild_id in
+                os.getenv('RESPONSE_CACHE_DISABLED_GUILDS', '').split(',')
+                if guild_id.strip()
+            ],
+            context_token_budget=int(os.getenv('CONTEXT_TOKEN_BUDGET', '2000')),
+            max_channel_tokens=int(os.getenv('MAX_CHANNEL_TOKENS', '20000')),
+            max_channel_bytes=int(os.getenv('MAX_CHANNEL_BYTES', str(256 * 1024))),
+            max_resident_channels=int(os.getenv('MAX_RESIDENT_CHANNELS', '5000')),
+            max_resident_bytes=int(os.getenv('MAX_RESIDENT_BYTES', str(64 * 1024 * 1024))),
+            conversation_idle_ttl=float(os.getenv('CONVERSATION_IDLE_TTL', str(6 * 3600))),
+            conversation_spill_dir=os.getenv('CONVERSATION_SPILL_DIR') or None,
+            conversation_compress_after=float(os.getenv('CONVERSATION_COMPRESS_AFTER', '600')),
+            persist_conversations=os.getenv('PERSIST_CONVERSATIONS', 'false').lower() in ('1', 'true', 'yes'),
+            persist_flush_interval=float(os.getenv('PERSIST_FLUSH_INTERVAL', '2.0')),
+            persist_batch_size=int(os.getenv('PERSIST_BATCH_SIZE', '200')),
+            summarize_conversations=os.getenv('SUMMARIZE_CONVERSATIONS', 'true').lower() in ('1', 'true', 'yes'),
+            summary_model=os.getenv('SUMMARY_MODEL') or None,
+            summary_threshold_tokens=int(os.getenv('SUMMARY_THRESHOLD_TOKENS', '4000')),
+            summary_keep_tokens=int(os.getenv('SUMMARY_KEEP_TOKENS', '2000')),
+            stream_responses=os.getenv('STREAM_RESPONSES', 'true').lower() in ('1', 'true', 'yes'),
+            stream_edit_interval=float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
         )
 
     def validate(self) -> bool:
@@ -59,7 +224,7 @@ class BotConfig:
         if not self.discord_token:
             errors.append("Discord token is required")
         
-        if not self.claude_api_key:
+        if not self.claude_api_key and not self.claude_api_keys:
             errors.append("Claude API key is required")
         
         if errors:
@@ -80,5 +245,8 @@ class BotConfig:
             'allowed_guilds': self.allowed_guilds,
             'bot_owners': self.bot_owners,
             'log_level': self.log_level,
-            'max_messages_per_minute': self.max_messages_per_minute
+            'max_messages_per_minute': self.max_messages_per_minute,
+            'claude_api_key_count': len(self.claude_api_keys) or 1,
+            'http_pool_limit': self.http_pool_limit,
+            'http_pool_limit_per_host': self.http_pool_limit_per_host
         }
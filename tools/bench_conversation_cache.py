@@ -0,0 +1,106 @@
+"""
+ConversationCache cost at 100k conversations
+
+    python -m tools.bench_conversation_cache
+
+Times ``add_message`` and ``get_recent_conversations`` against the previous
+implementation, which scanned every conversation on each add and scanned and
+sorted a whole server's conversations on each recent-conversations lookup.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from app.services.conversation_cache import ConversationCache
+
+CONVERSATIONS = 100_000
+SERVERS = 100
+SAMPLES = 200
+
+class LegacyConversationCache:
+    """The pre-index algorithms, kept only for comparison"""
+
+    def __init__(self, max_age_hours: int = 24):
+        self._conversations: Dict[str, Dict] = {}
+        self._last_interactions: Dict[str, datetime] = {}
+        self._max_age = timedelta(hours=max_age_hours)
+
+    def add_message(self, server_id: str, user_id: str, message: Dict[str, str], conversation_id: str):
+        if conversation_id not in self._conversations:
+            self._conversations[conversation_id] = {'server_id': server_id, 'user_id': user_id, 'messages': []}
+        self._conversations[conversation_id]['messages'].append({
+            **message,
+            'timestamp': datetime.utcnow().isoformat(),
+            'user_id': user_id
+        })
+        self._last_interactions[conversation_id] = datetime.utcnow()
+        self._prune_conversations()
+
+    def get_recent_conversations(self, server_id: str, limit: int = 5) -> List[Dict]:
+        recent = [
+            {'conversation_id': conv_id, 'last_interaction': self._last_interactions.get(conv_id)}
+            for conv_id, conv_data in self._conversations.items()
+            if conv_data['server_id'] == server_id
+        ]
+        recent.sort(key=lambda x: x['last_interaction'] or datetime.min, reverse=True)
+        return recent[:limit]
+
+    def _prune_conversations(self):
+        current_time = datetime.utcnow()
+        expired = [
+            conv_id for conv_id, last_interaction in self._last_interactions.items()
+            if current_time - last_interaction > self._max_age
+        ]
+        for conv_id in expired:
+            del self._conversations[conv_id]
+            del self._last_interactions[conv_id]
+
+MESSAGE = {'role': 'user', 'content': 'hello'}
+
+def per_call(func, samples: int = SAMPLES) -> float:
+    started = time.perf_counter()
+    for index in range(samples):
+        func(index)
+    return (time.perf_counter() - started) / samples
+
+async def main_async():
+    cache = ConversationCache(max_conversations=CONVERSATIONS)
+    started = time.perf_counter()
+    for index in range(CONVERSATIONS):
+        await cache.add_message(str(index % SERVERS), "user", MESSAGE, f"conv-{index}")
+    fill = time.perf_counter() - started
+
+    begin = time.perf_counter()
+    for index in range(SAMPLES):
+        await cache.add_message(str(index % SERVERS), "user", MESSAGE, f"conv-{index * 7}")
+    add = (time.perf_counter() - begin) / SAMPLES
+
+    begin = time.perf_counter()
+    for index in range(SAMPLES):
+        await cache.get_recent_conversations(str(index % SERVERS))
+    recent = (time.perf_counter() - begin) / SAMPLES
+
+    # Populating the legacy cache through add_message would take O(n^2) time
+    legacy = LegacyConversationCache()
+    now = datetime.utcnow()
+    for index in range(CONVERSATIONS):
+        conv_id = f"conv-{index}"
+        legacy._conversations[conv_id] = {'server_id': str(index % SERVERS), 'user_id': 'user', 'messages': []}
+        legacy._last_interactions[conv_id] = now
+    legacy_add = per_call(
+        lambda index: legacy.add_message(str(index % SERVERS), "user", MESSAGE, f"conv-{index * 7}"),
+        samples=20
+    )
+    legacy_recent = per_call(lambda index: legacy.get_recent_conversations(str(index % SERVERS)), samples=20)
+
+    print(f"{CONVERSATIONS:,} conversations across {SERVERS} servers (filled in {fill:.2f}s)")
+    print(f"{'operation':<28} {'legacy':>12} {'indexed':>12}")
+    print(f"{'add_message':<28} {legacy_add * 1e6:>9.1f} us {add * 1e6:>9.1f} us")
+    print(f"{'get_recent_conversations':<28} {legacy_recent * 1e6:>9.1f} us {recent * 1e6:>9.1f} us")
+
+def main():
+    asyncio.run(main_async())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Microbenchmark of context retrieval cost against stored history size
+
+    python -m tools.bench_conversation_context
+
+Compares ConversationManager with the previous approach (copy the whole deque
+to a list and re-format every returned message on each call), after checking
+that the chunk-aligned window never sends a turn without the history that fits.
+"""
+import timeit
+from collections import deque
+
+from app.services.conversation_manager import ConversationManager
+
+SIZES = (50, 500, 5000)
+CALLS = 2000
+
+def naive_get_context(history: deque, last_n: int = 5) -> str:
+    recent = list(history)[-last_n:]
+    return "\n".join(f"{'Assistant' if is_bot else 'User'}: {content}" for content, is_bot in recent)
+
+def build_manager(size: int) -> ConversationManager:
+    manager = ConversationManager(
+        max_messages=size,
+        max_channel_tokens=size * 100,
+        max_channel_bytes=size * 1000
+    )
+    for index in range(size):
+        manager.add_message(1, f"message {index} " + "lorem ipsum " * 10, is_bot=index % 2 == 1)
+    return manager
+
+def check_window(turns: int = 200):
+    """Short questions with long answers, where aligning could drop every packed message"""
+    manager = ConversationManager(context_token_budget=2000)
+    for turn in range(turns):
+        if turn:
+            assert manager.get_messages(1), f"turn {turn} got no history"
+        manager.add_message(1, "q" * 200, is_bot=False)
+        manager.add_message(1, "a" * 2000, is_bot=True)
+    print(f"context window: {turns} turns, none sent without history")
+
+def main():
+    check_window()
+    print(f"{'stored':>8} {'naive get_context':>20} {'get_context':>14} {'get_messages':>14}")
+    for size in SIZES:
+        manager = build_manager(size)
+        naive_history = deque(
+            ((msg.content, msg.is_bot) for msg in manager.conversations[1].messages),
+            maxlen=size
+        )
+
+        naive = timeit.timeit(lambda: naive_get_context(naive_history), number=CALLS) / CALLS
+        context = timeit.timeit(lambda: manager.get_context(1), number=CALLS) / CALLS
+        messages = timeit.timeit(lambda: manager.get_messages(1), number=CALLS) / CALLS
+
+        print(f"{size:>8} {naive * 1e6:>17.2f} us {context * 1e6:>11.2f} us {messages * 1e6:>11.2f} us")
+
+if __name__ == "__main__":
+    main()
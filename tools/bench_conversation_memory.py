@@ -0,0 +1,144 @@
+"""
+Memory used by stored conversation history, before and after compaction
+
+    python -m tools.bench_conversation_memory
+
+Reports bytes per 100k messages for ConversationManager's ``Message`` and
+ConversationCache's ``CachedMessage`` against the original representations
+(the ``Message(content, timestamp, is_bot)`` dataclass with a ``datetime``
+timestamp, and a plain dict with an ISO timestamp and duplicated user id).
+The dataclass with cached token/byte counts and a pre-rendered copy of the
+content, which the slotted class directly replaced, is shown as well.
+"""
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from app.services.conversation_cache import CachedMessage
+from app.services.conversation_manager import ConversationManager, Message
+
+MESSAGES = 100_000
+USERS = 50
+
+@dataclass
+class BaselineMessage:
+    content: str
+    timestamp: datetime
+    is_bot: bool
+
+@dataclass
+class LegacyMessage:
+    content: str
+    timestamp: datetime
+    is_bot: bool
+    tokens: int = 0
+    size: int = 0
+    rendered: str = ""
+
+def sample_content(index: int) -> str:
+    return f"Message {index}: " + "could you explain how the rate limiter handles bursts? " * 3
+
+def measure(build: Callable[[], List]) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+def baseline_messages() -> List:
+    return [
+        BaselineMessage(content=sample_content(index), timestamp=datetime.now(), is_bot=index % 2 == 1)
+        for index in range(MESSAGES)
+    ]
+
+def legacy_messages() -> List:
+    result = []
+    for index in range(MESSAGES):
+        content = sample_content(index)
+        is_bot = index % 2 == 1
+        result.append(LegacyMessage(
+            content=content,
+            timestamp=datetime.now(),
+            is_bot=is_bot,
+            tokens=len(content) // 4 + 4,
+            size=len(content.encode('utf-8')),
+            rendered=f"{'Assistant' if is_bot else 'User'}: {content}"
+        ))
+    return result
+
+def compact_messages(compress: bool = False) -> Callable[[], List]:
+    def build() -> List:
+        result = []
+        for index in range(MESSAGES):
+            content = sample_content(index)
+            message = Message(
+                content,
+                time.monotonic(),
+                index % 2 == 1,
+                tokens=len(content) // 4 + 4,
+                size=len(content.encode('utf-8'))
+            )
+            if compress:
+                message.compress()
+            result.append(message)
+        return result
+    return build
+
+def legacy_cache_messages() -> List:
+    return [
+        {
+            'role': 'assistant' if index % 2 else 'user',
+            'content': sample_content(index),
+            'timestamp': datetime.utcnow().isoformat(),
+            # Ids arrive as fresh strings from the Discord objects
+            'user_id': str(10**17 + index % USERS)
+        }
+        for index in range(MESSAGES)
+    ]
+
+def compact_cache_messages() -> List:
+    return [
+        CachedMessage(
+            {'role': 'assistant' if index % 2 else 'user', 'content': sample_content(index)},
+            str(10**17 + index % USERS),
+            time.time()
+        )
+        for index in range(MESSAGES)
+    ]
+
+def manager_history() -> List:
+    manager = ConversationManager(
+        max_messages=MESSAGES,
+        max_channel_tokens=MESSAGES * 100,
+        max_channel_bytes=MESSAGES * 1000,
+        max_total_bytes=MESSAGES * 1000
+    )
+    for index in range(MESSAGES):
+        manager.add_message(1, sample_content(index), is_bot=index % 2 == 1)
+    return [manager]
+
+def main():
+    # Content strings are shared by every variant, so report them separately
+    content_bytes = measure(lambda: [sample_content(index) for index in range(MESSAGES)])
+    rows = [
+        ("content strings alone", content_bytes),
+        ("Message (baseline dataclass)", measure(baseline_messages)),
+        ("Message (dataclass + cached counts)", measure(legacy_messages)),
+        ("Message (slotted)", measure(compact_messages())),
+        ("Message (slotted, zlib)", measure(compact_messages(compress=True))),
+        ("ConversationManager channel", measure(manager_history)),
+        ("ConversationCache (legacy dict)", measure(legacy_cache_messages)),
+        ("ConversationCache (CachedMessage)", measure(compact_cache_messages))
+    ]
+
+    print(f"{'representation':<36} {'bytes / 100k msgs':>18} {'bytes / msg':>12}")
+    for name, used in rows:
+        per_100k = used * 100_000 // MESSAGES
+        print(f"{name:<36} {per_100k:>18,} {used / MESSAGES:>12.1f}")
+
+if __name__ == "__main__":
+    main()
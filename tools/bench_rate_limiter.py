@@ -0,0 +1,101 @@
+"""
+RateLimiter cost at 1M keys
+
+    python -m tools.bench_rate_limiter
+
+Fills the limiter with a million user keys and times a check across the user,
+channel, guild and global scopes, then compares memory and per-check time
+against the previous implementation, which kept a list of ``datetime`` calls
+per key and rebuilt it on every check.
+"""
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from app.services.rate_limiter import RateLimit, RateLimiter
+
+KEYS = 1_000_000
+CHANNELS = 10_000
+GUILDS = 1_000
+SAMPLES = 200_000
+
+class LegacyRateLimiter:
+    """The list-of-timestamps algorithm, kept only for comparison"""
+
+    def __init__(self, max_calls: int = 10, period: timedelta = timedelta(minutes=1)):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls: Dict[str, List[datetime]] = {}
+
+    def is_allowed(self, key: str) -> bool:
+        now = datetime.now()
+        self._calls[key] = [
+            call_time for call_time in self._calls.get(key, [])
+            if now - call_time < self.period
+        ]
+        if len(self._calls[key]) < self.max_calls:
+            self._calls[key].append(now)
+            return True
+        return False
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def keys(index: int) -> Dict:
+    return {'user': index, 'channel': index % CHANNELS, 'guild': index % GUILDS, 'global': None}
+
+def fill(limiter, check, count: int) -> float:
+    tracemalloc.start()
+    for index in range(count):
+        check(limiter, index)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+def per_call(func, samples: int = SAMPLES) -> float:
+    started = time.perf_counter()
+    for index in range(samples):
+        func(index)
+    return (time.perf_counter() - started) / samples
+
+def main():
+    clock = FakeClock()
+    limits = {
+        'user': RateLimit(10, 60.0),
+        'channel': RateLimit(1_000_000, 60.0),
+        'guild': RateLimit(1_000_000, 60.0),
+        'global': RateLimit(10_000_000, 60.0)
+    }
+    limiter = RateLimiter(limits=limits, clock=clock)
+    memory = fill(limiter, lambda limiter, index: limiter.try_acquire(keys(index)), KEYS)
+    check = per_call(lambda index: limiter.try_acquire(keys(index * 7 % KEYS)))
+
+    # Everything refills after a minute; idle keys are dropped as checks continue
+    clock.now += 61.0
+    evict = per_call(lambda index: limiter.try_acquire(keys(index)), samples=KEYS // 16 + 1000)
+    resident = limiter.get_stats()['ratelimit_keys']
+
+    legacy = LegacyRateLimiter()
+    legacy_memory = fill(legacy, lambda legacy, index: legacy.is_allowed(str(index)), KEYS)
+    legacy_check = per_call(lambda index: legacy.is_allowed(str(index * 7 % KEYS)))
+    # A key near its limit pays for its whole call history on every check
+    legacy_hot = LegacyRateLimiter(max_calls=1000)
+    legacy_hot_check = per_call(lambda index: legacy_hot.is_allowed('hot'), samples=5000)
+    hot = RateLimiter(limits={'user': RateLimit(1000, 60.0)}, clock=clock)
+    hot_check = per_call(lambda index: hot.try_acquire({'user': 'hot'}), samples=5000)
+
+    print(f"{KEYS:,} user keys, {CHANNELS:,} channels, {GUILDS:,} guilds")
+    print(f"{'':<32} {'legacy':>12} {'gcra':>12}")
+    print(f"{'memory after fill':<32} {legacy_memory / 2**20:>9.1f} MB {memory / 2**20:>9.1f} MB")
+    print(f"{'check (legacy: 1 scope, gcra: 4)':<32} {legacy_check * 1e6:>9.2f} us {check * 1e6:>9.2f} us")
+    print(f"{'check, key with 1000 calls':<32} {legacy_hot_check * 1e6:>9.2f} us {hot_check * 1e6:>9.2f} us")
+    print(f"{'check while evicting idle keys':<32} {'':>12} {evict * 1e6:>9.2f} us")
+    print(f"keys resident after idling: {resident:,} (legacy never evicts: {len(legacy._calls):,})")
+
+if __name__ == "__main__":
+    main()
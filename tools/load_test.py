@@ -0,0 +1,160 @@
+"""
+Drive ClaudeService at a target concurrency and report throughput and latency
+
+By default an in-process mock server is started, so no API budget is spent:
+
+    python -m tools.load_test --requests 500 --concurrency 50 --stream
+
+Use ``--url`` to target an already running ``tools.mock_anthropic`` (or any
+compatible endpoint). Mock options such as ``--latency-ms`` and
+``--rate-limit-rate`` apply to the in-process server only.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from app.services.claude_service import ClaudeService
+from app.services.concurrency_governor import ConcurrencyGovernor
+from app.services.resilience import ResilientCaller
+from tools.mock_anthropic import MockAnthropicServer, add_config_arguments, config_from_arguments
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def _one_request(service: ClaudeService, prompt: str, stream: bool, result: Dict):
+    started = time.perf_counter()
+    try:
+        if stream:
+            first_token = None
+            async for _ in service.get_stream_response("load-test", prompt, 0, "load-test"):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+            result['ttft'].append(first_token or 0.0)
+        else:
+            await service.get_response("load-test", prompt, 0, "load-test")
+        result['latencies'].append(time.perf_counter() - started)
+    except Exception as e:
+        result['errors'].append(str(e))
+
+async def run_load(
+    service: ClaudeService,
+    requests: int,
+    concurrency: int,
+    stream: bool = False,
+    unique_ratio: float = 1.0
+) -> Dict:
+    """
+    Send ``requests`` calls with at most ``concurrency`` in flight
+
+    :param unique_ratio: Fraction of prompts that are distinct; the rest repeat
+        a small set of popular prompts (exercises caching and coalescing)
+    """
+    result: Dict = {'latencies': [], 'ttft': [], 'errors': []}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(index: int):
+        if random.random() < unique_ratio:
+            prompt = f"Load test question number {index}"
+        else:
+            prompt = f"Popular question {index % 5}"
+        async with semaphore:
+            await _one_request(service, prompt, stream, result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = result['latencies']
+    report = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'stream': stream,
+        'succeeded': len(latencies),
+        'failed': len(result['errors']),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_p50': round(percentile(latencies, 0.50), 4),
+        'latency_p95': round(percentile(latencies, 0.95), 4),
+        'latency_p99': round(percentile(latencies, 0.99), 4)
+    }
+    if stream:
+        report.update({
+            'ttft_p50': round(percentile(result['ttft'], 0.50), 4),
+            'ttft_p95': round(percentile(result['ttft'], 0.95), 4),
+            'ttft_p99': round(percentile(result['ttft'], 0.99), 4)
+        })
+    if result['errors']:
+        report['sample_errors'] = sorted(set(result['errors']))[:3]
+    return report
+
+async def main_async(args: argparse.Namespace):
+    runner = None
+    url = args.url
+    if url is None:
+        server = MockAnthropicServer(config_from_arguments(args))
+        runner = web.AppRunner(server.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", args.port)
+        await site.start()
+        url = f"http://127.0.0.1:{args.port}/v1/messages"
+
+    governor: Optional[ConcurrencyGovernor] = None
+    if args.governor:
+        governor = ConcurrencyGovernor(
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            max_concurrency=args.max_concurrency
+        )
+
+    service = ClaudeService(
+        api_key="mock-key",
+        api_url=url,
+        resilience=ResilientCaller(max_retries=args.max_retries, base_delay=0.1),
+        governor=governor
+    )
+    try:
+        report = await run_load(
+            service,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            stream=args.stream,
+            unique_ratio=args.unique_ratio
+        )
+        stats = service.get_stats()
+        report['service'] = {
+            key: value for key, value in stats.items()
+            if key not in ('api_keys', 'models', 'breakers')
+        }
+        report['http_pool'] = service.http_client.get_stats()
+        print(json.dumps(report, indent=2))
+    finally:
+        await service.http_client.close()
+        if runner is not None:
+            await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test ClaudeService against a mock Messages API")
+    parser.add_argument("--url", help="Target an existing endpoint instead of the in-process mock")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--unique-ratio", type=float, default=1.0)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--governor", action="store_true", help="Route calls through a ConcurrencyGovernor")
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=1_000_000)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    add_config_arguments(parser)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
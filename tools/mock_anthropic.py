@@ -0,0 +1,296 @@
+"""
+Local stand-in for the Anthropic Messages API
+
+Run with ``python -m tools.mock_anthropic --port 8089`` and point the bot at it
+with ``ANTHROPIC_API_URL=http://127.0.0.1:8089/v1/messages``.
+
+Supports non-streaming and SSE streaming responses, configurable latency
+distributions and output token rates, injected 429/5xx errors, a local
+requests-per-minute limit with ``anthropic-ratelimit-*`` headers, and
+``usage`` reporting.
+
+Prompt caching is emulated: every ``cache_control`` breakpoint's prefix is
+hashed, and a prefix seen before is reported as ``cache_read_input_tokens``
+instead of ``cache_creation_input_tokens`` in the returned ``usage``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 4
+
+def _block_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+def _has_cache_control(content) -> bool:
+    return isinstance(content, list) and any("cache_control" in block for block in content)
+
+@dataclass
+class MockConfig:
+    # Time to first token, in milliseconds
+    latency_ms: float = 300.0
+    # fixed | uniform | exponential | lognormal
+    latency_distribution: str = "lognormal"
+    # Spread of the distribution (sigma for lognormal, +/- fraction for uniform)
+    latency_spread: float = 0.5
+    # Output generation speed; 0 means instant
+    tokens_per_second: float = 0.0
+    # Output length in words (capped by the request's max_tokens)
+    output_words: int = 50
+    # Fraction of requests answered with 429 / 529
+    rate_limit_rate: float = 0.0
+    overload_rate: float = 0.0
+    # Fraction of requests answered with 500
+    error_rate: float = 0.0
+    retry_after: float = 1.0
+    # Server-side requests-per-minute limit; 0 disables it
+    requests_per_minute: int = 0
+
+class MockAnthropicServer:
+    def __init__(self, config: Optional[MockConfig] = None, reply_text: Optional[str] = None):
+        self.config = config or MockConfig()
+        self.reply_text = reply_text
+        self.cached_prefixes: Set[str] = set()
+        self._recent_requests: Deque[float] = deque()
+
+        self.requests = 0
+        self.status_counts: Dict[int, int] = {}
+
+    def _sample_latency(self) -> float:
+        mean = self.config.latency_ms / 1000
+        spread = self.config.latency_spread
+        distribution = self.config.latency_distribution
+        if distribution == "fixed" or mean <= 0:
+            return max(0.0, mean)
+        if distribution == "uniform":
+            return random.uniform(mean * (1 - spread), mean * (1 + spread))
+        if distribution == "exponential":
+            return random.expovariate(1 / mean)
+        # Lognormal with the requested median, which gives a realistic long tail
+        return random.lognormvariate(0, spread) * mean
+
+    def _reply_words(self, max_tokens: int) -> List[str]:
+        if self.reply_text is not None:
+            words = self.reply_text.split(" ")
+        else:
+            words = [f"word{i}" for i in range(self.config.output_words)]
+        # Roughly one token per word
+        return words[:max(1, max_tokens)]
+
+    def _account_usage(self, data: Dict, output_text: str) -> Dict[str, int]:
+        """
+        Split input tokens into cached, newly cached and uncached parts
+        """
+        segments: List[Tuple[str, bool]] = []
+        system = data.get("system", "")
+        segments.append((_block_text(system), _has_cache_control(system)))
+        for turn in data.get("messages", []):
+            content = turn.get("content", "")
+            segments.append((f"{turn.get('role')}:{_block_text(content)}", _has_cache_control(content)))
+
+        # The last breakpoint defines the longest cacheable prefix
+        digest = hashlib.sha256(data.get("model", "").encode())
+        prefix_tokens = 0
+        total_tokens = 0
+        cached_key = None
+        for text, breakpoint in segments:
+            digest.update(text.encode())
+            total_tokens += estimate_tokens(text)
+            if breakpoint:
+                cached_key = digest.hexdigest()
+                prefix_tokens = total_tokens
+
+        usage = {
+            "input_tokens": total_tokens - prefix_tokens,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "output_tokens": estimate_tokens(output_text)
+        }
+        if cached_key is not None:
+            if cached_key in self.cached_prefixes:
+                usage["cache_read_input_tokens"] = prefix_tokens
+            else:
+                self.cached_prefixes.add(cached_key)
+                usage["cache_creation_input_tokens"] = prefix_tokens
+        return usage
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        if not self.config.requests_per_minute:
+            return {}
+        remaining = max(0, self.config.requests_per_minute - len(self._recent_requests))
+        return {
+            "anthropic-ratelimit-requests-limit": str(self.config.requests_per_minute),
+            "anthropic-ratelimit-requests-remaining": str(remaining)
+        }
+
+    def _injected_error(self) -> Optional[web.Response]:
+        """Decide whether this request fails, before any latency is spent"""
+        now = time.monotonic()
+        if self.config.requests_per_minute:
+            while self._recent_requests and now - self._recent_requests[0] > 60:
+                self._recent_requests.popleft()
+            if len(self._recent_requests) >= self.config.requests_per_minute:
+                retry_after = 60 - (now - self._recent_requests[0])
+                return self._error(429, "rate_limit_error", "Number of requests has exceeded your rate limit", retry_after)
+            self._recent_requests.append(now)
+
+        roll = random.random()
+        if roll < self.config.rate_limit_rate:
+            return self._error(429, "rate_limit_error", "Injected rate limit", self.config.retry_after)
+        roll -= self.config.rate_limit_rate
+        if roll < self.config.overload_rate:
+            return self._error(529, "overloaded_error", "Injected overload")
+        roll -= self.config.overload_rate
+        if roll < self.config.error_rate:
+            return self._error(500, "api_error", "Injected internal error")
+        return None
+
+    def _error(self, status: int, error_type: str, message: str, retry_after: Optional[float] = None) -> web.Response:
+        headers = self._rate_limit_headers()
+        if retry_after is not None:
+            headers["retry-after"] = str(max(1, round(retry_after)))
+        return web.json_response(
+            {"type": "error", "error": {"type": error_type, "message": message}},
+            status=status,
+            headers=headers
+        )
+
+    def _message(self, data: Dict, usage: Dict, content: List[Dict]) -> Dict:
+        return {
+            "id": f"msg_mock_{uuid.uuid4().hex[:16]}",
+            "type": "message",
+            "role": "assistant",
+            "model": data.get("model"),
+            "content": content,
+            "stop_reason": "end_turn" if content else None,
+            "stop_sequence": None,
+            "usage": usage
+        }
+
+    def _count(self, status: int):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    async def handle_messages(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        data = await request.json()
+
+        error = self._injected_error()
+        if error is not None:
+            self._count(error.status)
+            return error
+
+        words = self._reply_words(int(data.get("max_tokens", 1000)))
+        text = " ".join(words)
+        usage = self._account_usage(data, text)
+        token_delay = 1 / self.config.tokens_per_second if self.config.tokens_per_second else 0.0
+
+        await asyncio.sleep(self._sample_latency())
+        self._count(200)
+
+        if not data.get("stream"):
+            await asyncio.sleep(token_delay * len(words))
+            return web.json_response(
+                self._message(data, usage, [{"type": "text", "text": text}]),
+                headers=self._rate_limit_headers()
+            )
+
+        response = web.StreamResponse(headers={
+            "content-type": "text/event-stream",
+            **self._rate_limit_headers()
+        })
+        await response.prepare(request)
+
+        async def send(event: str, payload: Dict):
+            await response.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode())
+
+        await send("message_start", {
+            "type": "message_start",
+            "message": self._message(data, {**usage, "output_tokens": 1}, [])
+        })
+        await send("content_block_start", {
+            "type": "content_block_start",
+            "index": 0,
+            "content_block": {"type": "text", "text": ""}
+        })
+        for index, word in enumerate(words):
+            await send("content_block_delta", {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": word if index == 0 else " " + word}
+            })
+            await asyncio.sleep(token_delay)
+        await send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        await send("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": usage["output_tokens"]}
+        })
+        await send("message_stop", {"type": "message_stop"})
+        await response.write_eof()
+        return response
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "requests": self.requests,
+            "status_counts": {str(status): count for status, count in self.status_counts.items()},
+            "cached_prefixes": len(self.cached_prefixes)
+        })
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/messages", self.handle_messages)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = MockConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency-distribution", default=defaults.latency_distribution,
+                        choices=["fixed", "uniform", "exponential", "lognormal"])
+    parser.add_argument("--latency-spread", type=float, default=defaults.latency_spread)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--output-words", type=int, default=defaults.output_words)
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--overload-rate", type=float, default=defaults.overload_rate)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--requests-per-minute", type=int, default=defaults.requests_per_minute)
+
+def config_from_arguments(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        latency_spread=args.latency_spread,
+        tokens_per_second=args.tokens_per_second,
+        output_words=args.output_words,
+        rate_limit_rate=args.rate_limit_rate,
+        overload_rate=args.overload_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        requests_per_minute=args.requests_per_minute
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockAnthropicServer(config_from_arguments(args))
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()